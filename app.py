@@ -9,21 +9,99 @@ and navigate to http://localhost:8000 in your browser.
 
 from __future__ import annotations
 
+import asyncio
+import importlib
+import json
+import logging
+import os
+import threading
+import time
 import urllib
+import uuid
+from collections import OrderedDict
+from dataclasses import replace
+from functools import partial
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, AsyncIterator, BinaryIO, Callable
 
 import gradio as gr
-import rerun as rr
-from datasets import load_dataset
-from fastapi import FastAPI
+from datasets import Dataset, load_dataset
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response, StreamingResponse
 from gradio_huggingfacehub_search import HuggingfaceHubSearch
-from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
 
-from dataset_conversion import log_dataset_to_rerun, log_lerobot_dataset_to_rerun
+from batching import BATCHER_PRESETS
+from dataset_conversion import (
+    QUICK_PREVIEW,
+    VIDEO_JPEG_QUALITY,
+    Preview,
+    is_lerobot_dataset,
+    log_dataset_to_rerun,
+    log_lerobot_dataset_to_rerun,
+    recording_key,
+    recording_to_file,
+)
+from dataset_mirror import DatasetMirror, DirectoryBackend
+from episode_index import dataset_revision, load_episode, load_episode_index
+from jobs import Job, JobScheduler, QueueFullError
+from pipeline import PipelineOptions
+from profiling import Profile
+from rrd_cache import RrdCache
+from rrd_response import recording_response
+from segments import segment_preview, segment_ranges, write_segments
+from video_decoder import warm_up_encoder_pool
+
+if TYPE_CHECKING:
+    from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+
+logger = logging.getLogger(__name__)
 
 CUSTOM_PATH = "/"
 
+# How many rows ahead of logging video frames are decoded, in parallel across cameras:
+PREFETCH_ROWS = 16
+
+# Rows are read on a background thread while earlier rows are logged, see `PipelineOptions`. They are converted on the
+# logging thread, as converting them on threads was slower in `scripts/benchmark_conversion.py`:
+PIPELINE = PipelineOptions(read_ahead=64, convert_workers=0)
+
+# How logged data is batched into chunks while converting, see `BATCHER_PRESETS`. Recordings are written to
+# files, so `file` by default, `viewer` gets data to viewers that follow a conversion sooner:
+BATCHER = BATCHER_PRESETS[os.environ.get("BATCHER", "file")]
+
+# How many LeRobot datasets are kept open between requests:
+MAX_OPEN_DATASETS = 4
+
+# Set `WARM_UP=1` to import the conversion stack at startup, rather than on the first request, and to
+# open the (comma separated) `WARM_DATASETS` ahead of time:
+WARM_UP = os.environ.get("WARM_UP") == "1"
+WARM_DATASETS = [dataset_id for dataset_id in os.environ.get("WARM_DATASETS", "").split(",") if dataset_id]
+
+# Set `DATASET_MIRROR=<dir>` to keep the files of the datasets that are shown in that directory, so that they are
+# only downloaded once, and `DATASET_SOURCE=<dir>` to read datasets from a local directory instead of the Hub:
+DATASET_MIRROR = os.environ.get("DATASET_MIRROR")
+DATASET_SOURCE = os.environ.get("DATASET_SOURCE")
+
+# Imported by conversions only, see `warm_up`:
+CONVERSION_MODULES = ["torch", "cv2", "PIL.Image", "lerobot.common.datasets.lerobot_dataset"]
+
+# How many conversions run at once, and how many more may wait for a free worker:
+MAX_CONCURRENT_CONVERSIONS = 2
+MAX_QUEUED_CONVERSIONS = 16
+
+# Seconds between progress updates sent to the UI:
+PROGRESS_INTERVAL = 0.5
+
+# Recordings that are still being converted are streamed to the viewer in chunks of this size,
+# polling for newly written data at this interval (in seconds):
+STREAM_CHUNK_SIZE = 1024 * 1024
+STREAM_POLL_INTERVAL = 0.1
+
+# Set `COMPRESS_RECORDINGS=1` to gzip recordings for clients that accept it. That costs CPU for every download,
+# and saves less than usual since recordings are partly compressed already:
+COMPRESS_RECORDINGS = os.environ.get("COMPRESS_RECORDINGS") == "1"
+
 app = FastAPI()
 
 origins = [
@@ -33,37 +111,329 @@ origins = [
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
+    # The viewer fetches recordings from another origin, with range and conditional requests:
+    allow_headers=["Range", "If-Range", "If-None-Match"],
+    expose_headers=["Accept-Ranges", "Content-Length", "Content-Range", "ETag"],
 )
 
+rrd_cache = RrdCache(Path("tmp"))
+
+# The segments that recordings are joined from (see `segments.py`) are cached apart from the recordings,
+# within their own budget, so that they don't take the place of twice as many recordings:
+SEGMENT_CACHE_BYTES = 2 * 1024**3
+segment_cache = RrdCache(Path("tmp/segments"), max_bytes=SEGMENT_CACHE_BYTES)
+
+EPISODE_INDEX_DIR = Path("tmp/episode_index")
+
+dataset_mirror = None
+if DATASET_MIRROR:
+    backend = DirectoryBackend(Path(DATASET_SOURCE)) if DATASET_SOURCE else None
+    dataset_mirror = DatasetMirror(Path(DATASET_MIRROR), backend)
+
+scheduler = JobScheduler(max_workers=MAX_CONCURRENT_CONVERSIONS, max_queued=MAX_QUEUED_CONVERSIONS)
+
+
+# Stage timings and counters, summed over all conversions since the app started:
+conversion_metrics = Profile()
+
+_open_datasets: OrderedDict[tuple[str, str | None], LeRobotDataset] = OrderedDict()
+_open_datasets_lock = threading.Lock()
+
+
+def open_lerobot_dataset(dataset_id: str, revision: str | None) -> LeRobotDataset:
+    """A LeRobot dataset, kept open between requests so that its metadata is only loaded once per revision."""
+    with _open_datasets_lock:
+        dataset = _open_datasets.get((dataset_id, revision))
+        if dataset is not None:
+            _open_datasets.move_to_end((dataset_id, revision))
+            return dataset
+
+    from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+
+    dataset = LeRobotDataset(dataset_id)
+    with _open_datasets_lock:
+        _open_datasets[(dataset_id, revision)] = dataset
+        while len(_open_datasets) > MAX_OPEN_DATASETS:
+            _open_datasets.popitem(last=False)
+    return dataset
+
+
+def warm_up(dataset_ids: list[str]) -> None:
+    """Import what conversions need, start the frame encoders and open `dataset_ids`, ahead of the first requests."""
+    start_time = time.perf_counter()
+    for module in CONVERSION_MODULES:
+        try:
+            importlib.import_module(module)
+        except ImportError as err:
+            logger.warning(f"Failed to import {module} while warming up: {err}")
+
+    try:
+        warm_up_encoder_pool()
+    except Exception as err:
+        logger.warning(f"Failed to start the frame encoders while warming up: {err}")
+
+    for dataset_id in dataset_ids:
+        try:
+            revision = dataset_revision(dataset_id)
+            if is_lerobot_dataset(dataset_id):
+                open_lerobot_dataset(dataset_id, revision)
+            else:
+                dataset = load_dataset(dataset_id, split="train", streaming=True, revision=revision)
+                load_episode_index(dataset, dataset_id, revision, EPISODE_INDEX_DIR)
+        except Exception as err:
+            logger.warning(f"Failed to open {dataset_id} while warming up: {err}")
+
+    logger.info(f"Warmed up in {time.perf_counter() - start_time:.1f}s")
+
+
+if WARM_UP:
+    threading.Thread(target=warm_up, args=(WARM_DATASETS,), name="warm-up", daemon=True).start()
+
+
+@app.get("/cache_stats")
+def cache_stats() -> dict[str, int]:
+    return {**rrd_cache.stats(), **{f"segments_{name}": value for name, value in segment_cache.stats().items()}}
+
+
+@app.get("/metrics")
+def metrics() -> dict[str, Any]:
+    """The time spent in each stage of the conversions so far, and counters like decoded frames and logged bytes."""
+    return conversion_metrics.report()
+
+
+def _open_recording(key: str) -> BinaryIO | None:
+    """The recording for `key` while it is being written, or once it is cached. `None` if there is none (yet)."""
+    try:
+        # The file stays readable through this handle after it is renamed into the cache:
+        return open(rrd_cache.in_progress_path(key) or rrd_cache.path(key), "rb")
+    except FileNotFoundError:
+        return None
+
+
+async def follow_recording(key: str, job: Job) -> AsyncIterator[bytes]:
+    """
+    Streams the recording for `key` while it is being written, until its conversion finishes.
+
+    Files are opened and read on the default executor, so that slow disks don't hold up the event loop.
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        done = job.future.done()
+        file = await loop.run_in_executor(None, _open_recording, key)
+        if file is not None:
+            break
+        if done:
+            return  # the conversion failed
+        await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+    with file:
+        while True:
+            chunk = await loop.run_in_executor(None, file.read, STREAM_CHUNK_SIZE)
+            if chunk:
+                yield chunk
+            elif job.future.done():
+                # Pick up anything written between the last read and the end of the conversion:
+                chunk = await loop.run_in_executor(None, file.read)
+                if chunk:
+                    yield chunk
+                return
+            else:
+                await asyncio.sleep(STREAM_POLL_INTERVAL)
+
+
+@app.get("/recordings/{key}.rrd")
+def recording(key: str, request: Request) -> Response:
+    """
+    Serves a converted recording, or streams it while it is still being converted.
+
+    Converted recordings are cached by the browser and support range requests, see `recording_response`.
+    Recordings that are still being converted aren't cached.
+    """
+    digest = rrd_cache.digest(key)
+    if digest is not None:
+        try:
+            file = open(rrd_cache.path(key), "rb")
+        except FileNotFoundError:
+            pass  # evicted in the meantime
+        else:
+            return recording_response(file, digest, request.headers, compress=COMPRESS_RECORDINGS)
+
+    job = scheduler.get(key)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"No recording {key}")
+    return StreamingResponse(
+        follow_recording(key, job), media_type="application/octet-stream", headers={"Cache-Control": "no-store"}
+    )
+
 
 def html_template(rrd: str, app_url: str = "https://app.rerun.io") -> str:
     encoded_url = urllib.parse.quote(rrd)
     return f"""<div style="width:100%; height:70vh;"><iframe style="width:100%; height:100%;" src="{app_url}?url={encoded_url}" frameborder="0" allowfullscreen=""></iframe></div>"""
 
 
-def show_dataset(dataset_id: str, episode_index: int) -> str:
-    rr.init("dataset")
+def convert_episode(
+    filename: Path,
+    dataset_id: str,
+    revision: str | None,
+    episode_index: int,
+    batch_size: int,
+    encoded_images: bool,
+    preview: Preview | None,
+    progress: Callable[[int, int | None], None] | None = None,
+) -> None:
+    """
+    Converts an episode to `filename`.
 
-    # TODO(jleibs): manage cache better and put in proper storage
-    filename = Path(f"tmp/{dataset_id}_{episode_index}.rrd")
-    if not filename.exists():
-        filename.parent.mkdir(parents=True, exist_ok=True)
+    Episodes whose length is known up front are converted a segment of rows at a time (see `segments.py`),
+    reusing the segments that earlier conversions cached, including ones that were interrupted.
+    """
+    profile = Profile()
+    jpeg_quality = VIDEO_JPEG_QUALITY if encoded_images else None
+    try:
+        if is_lerobot_dataset(dataset_id):
+            with profile.span("load"):
+                dataset = open_lerobot_dataset(dataset_id, revision)
+            episode_data_index = dataset.episode_data_index
+            num_rows: int | None = int(
+                episode_data_index["to"][episode_index] - episode_data_index["from"][episode_index]
+            )
+            log = partial(
+                log_lerobot_dataset_to_rerun,
+                dataset,
+                episode_index,
+                batch_size=batch_size,
+                prefetch_rows=PREFETCH_ROWS,
+                encoded_images=encoded_images,
+                jpeg_quality=jpeg_quality,
+                profile=profile,
+                pipeline=PIPELINE,
+            )
+        else:
+            # Episodes are for LeRobot datasets (https://huggingface.co/lerobot):
+            with profile.span("load"):
+                ds_subset = load_episode(
+                    dataset_id, episode_index, revision=revision, cache_dir=EPISODE_INDEX_DIR, mirror=dataset_mirror
+                )
+            num_rows = len(ds_subset) if isinstance(ds_subset, Dataset) else None  # unknown while streaming
+            log = partial(
+                log_dataset_to_rerun,
+                ds_subset,
+                batch_size=batch_size,
+                encoded_images=encoded_images,
+                profile=profile,
+                pipeline=PIPELINE,
+            )
 
-        rr.save(filename.as_posix())
+        ranges = segment_ranges(num_rows, preview) if num_rows is not None else None
+        if ranges is None:
+            # The file is flushed and closed before it is moved into the cache.
+            with recording_to_file(filename, batcher=BATCHER) as recording:
+                log(preview=preview, recording=recording, progress=progress)
+            return
+
+        # What all segments of the recording have in common, whatever the window:
+        options = replace(preview or Preview(), start=None, end=None)
+        key = recording_key(dataset_id, revision, episode_index, encoded_images, jpeg_quality, options)
+        recording_id = str(uuid.uuid5(uuid.NAMESPACE_URL, key))
+        window_start = ranges[0][0] if ranges else 0
+        window_rows = sum(stop - start for start, stop in ranges)
+
+        def convert_segment(start: int, stop: int, path: Path) -> None:
+            def segment_progress(rows_done: int, total_rows: int | None) -> None:
+                if progress is not None:
+                    rows = (stop - start) * rows_done // total_rows if total_rows else rows_done
+                    progress(start - window_start + rows, window_rows)
+
+            with recording_to_file(path, recording_id=recording_id, batcher=BATCHER) as recording:
+                log(preview=segment_preview(preview, start, stop), recording=recording, progress=segment_progress)
+
+        segments = [
+            (
+                recording_key(dataset_id, revision, episode_index, encoded_images, jpeg_quality, options, segment=span),
+                partial(convert_segment, *span),
+            )
+            for span in ranges
+        ]
+        converted = write_segments(filename, segment_cache, segments)
+        profile.count("segments", len(segments))
+        profile.count("segments_converted", converted)
+    finally:
+        profile.count("conversions")
+        conversion_metrics.merge(profile)
+        report = {"dataset_id": dataset_id, "episode_index": episode_index, **profile.report()}
+        logger.info(f"Conversion profile: {json.dumps(report)}")
 
-        if "/" in dataset_id and dataset_id.split("/")[0] == "lerobot":
-            dataset = LeRobotDataset(dataset_id)
-            log_lerobot_dataset_to_rerun(dataset, episode_index)
-        else:
-            dataset = load_dataset(dataset_id, split="train", streaming=True)
 
-            # This is for LeRobot datasets (https://huggingface.co/lerobot):
-            ds_subset = dataset.filter(
-                lambda frame: "episode_index" not in frame or frame["episode_index"] == episode_index
+async def show_dataset(
+    dataset_id: str,
+    episode_index: int,
+    batch_size: int = 0,
+    encoded_images: bool = True,
+    quick_preview: bool = True,
+    stream: bool = True,
+    progress: gr.Progress = gr.Progress(),
+) -> AsyncIterator[tuple[Any, Any]]:
+    """
+    Converts the episode, yielding `(rrd file, recording url)` updates for the UI.
+
+    The viewer loads the recording from its url. When `stream` is set it is pointed there right away, so it
+    shows the recording while it is being converted. Otherwise it is once the conversion finished, and the
+    finished file is also returned for download.
+    When `quick_preview` is set only part of the episode is converted, see `QUICK_PREVIEW`.
+    """
+    preview = QUICK_PREVIEW if quick_preview else None
+    loop = asyncio.get_running_loop()
+    if dataset_mirror is not None and not is_lerobot_dataset(dataset_id):
+        revision = await loop.run_in_executor(None, dataset_mirror.resolve_revision, dataset_id)
+    else:
+        revision = await loop.run_in_executor(None, dataset_revision, dataset_id)
+    episode_index = int(episode_index)
+    jpeg_quality = VIDEO_JPEG_QUALITY if encoded_images else None
+    key = recording_key(dataset_id, revision, episode_index, bool(encoded_images), jpeg_quality, preview)
+    recording_url = f"recordings/{key}.rrd"
+
+    cached = rrd_cache.get(key)
+    if cached is not None:
+        yield (gr.update() if stream else cached.as_posix()), recording_url
+        return
+
+    def run(job: Job) -> str:
+        def convert(filename: Path) -> None:
+            convert_episode(
+                filename,
+                dataset_id,
+                revision,
+                episode_index,
+                int(batch_size),
+                encoded_images,
+                preview,
+                job.report_progress,
             )
-            log_dataset_to_rerun(ds_subset)
 
-    return filename.as_posix()
+        return rrd_cache.get_or_create(key, convert).as_posix()
+
+    try:
+        job = scheduler.submit(key, run)
+    except QueueFullError as err:
+        raise gr.Error(f"The server is busy, please try again later. {err}") from err
+
+    # Gradio cancels this task when the client goes away, which releases (and possibly cancels) the job.
+    try:
+        if stream:
+            yield gr.update(), recording_url
+
+        while not job.future.done():
+            if job.rows_done == 0:
+                progress(None, desc="Queued" if job.queued else "Loading dataset…")
+            else:
+                progress((job.rows_done, job.total_rows), desc="Converting", unit="rows")
+            await asyncio.sleep(PROGRESS_INTERVAL)
+
+        filename = job.future.result()
+        if not stream:
+            yield filename, recording_url
+    finally:
+        scheduler.release(job)
 
 
 with gr.Blocks() as demo:
@@ -75,19 +445,29 @@ with gr.Blocks() as demo:
             search_type="dataset",
         )
         episode_index = gr.Number(1, label="Episode Index")
+        batch_size = gr.Number(0, label="Batch Size (0 = row by row)", precision=0)
+        encoded_images = gr.Checkbox(True, label="Keep images compressed")
+        quick_preview = gr.Checkbox(True, label="Quick preview (10 Hz, low resolution)")
+        stream = gr.Checkbox(True, label="Show while converting")
         button = gr.Button("Show Dataset")
     with gr.Row():
         rrd = gr.File()
+        recording_url = gr.Textbox(visible=False)
     with gr.Row():
         viewer = gr.HTML()
 
-    button.click(show_dataset, inputs=[search_in, episode_index], outputs=rrd)
-    rrd.change(
+    button.click(
+        show_dataset,
+        inputs=[search_in, episode_index, batch_size, encoded_images, quick_preview, stream],
+        outputs=[rrd, recording_url],
+    )
+    # The viewer loads recordings from `/recordings`, rather than from Gradio's copy of the file, so that the
+    # browser can cache them:
+    recording_url.change(
         html_template,
-        js="""(rrd) => { console.log(rrd.url); return rrd.url}""",
-        inputs=[rrd],
+        js="""(url) => new URL(url, window.location.href).href""",
+        inputs=[recording_url],
         outputs=viewer,
-        preprocess=False,
     )
 
 
@@ -0,0 +1,81 @@
+"""How the Rerun SDK batches logged data into chunks before sending it to a sink, set per recording."""
+
+from __future__ import annotations
+
+import os
+import threading
+from dataclasses import dataclass
+
+import rerun as rr
+import rerun_bindings
+
+
+@dataclass(frozen=True)
+class BatcherOptions:
+    """
+    When the SDK sends the rows logged so far to the sink, as chunks.
+
+    That is every `flush_tick_seconds`, or as soon as `flush_num_bytes` or `flush_num_rows` are pending,
+    whichever comes first. `None` keeps the SDK's default (or what the `RERUN_FLUSH_*` environment
+    variables set). Larger chunks are cheaper to write and compress better, smaller ones reach a viewer sooner.
+    """
+
+    flush_tick_seconds: float | None = None
+    flush_num_bytes: int | None = None
+    flush_num_rows: int | None = None
+
+    def env(self) -> dict[str, str]:
+        """The environment variables the SDK reads these settings from."""
+        env = {}
+        if self.flush_tick_seconds is not None:
+            env["RERUN_FLUSH_TICK_SECS"] = str(self.flush_tick_seconds)
+        if self.flush_num_bytes is not None:
+            env["RERUN_FLUSH_NUM_BYTES"] = str(self.flush_num_bytes)
+        if self.flush_num_rows is not None:
+            env["RERUN_FLUSH_NUM_ROWS"] = str(self.flush_num_rows)
+        return env
+
+
+# Conversions to files: nobody watches the data arrive, so rows are collected for longer. Larger byte limits
+# mostly cost memory with large rows (e.g. images), which fill chunks by themselves.
+FILE_BATCHER = BatcherOptions(flush_tick_seconds=1.0, flush_num_bytes=1024 * 1024)
+
+# Live viewers: data is sent within a frame or so of being logged.
+VIEWER_BATCHER = BatcherOptions(flush_tick_seconds=0.016, flush_num_bytes=256 * 1024)
+
+BATCHER_PRESETS = {"default": BatcherOptions(), "file": FILE_BATCHER, "viewer": VIEWER_BATCHER}
+
+# Held while the environment is changed to create a recording, see `new_recording`:
+_env_lock = threading.Lock()
+
+
+def new_recording(application_id: str, batcher: BatcherOptions | None = None, **kwargs: object) -> rr.RecordingStream:
+    """
+    `rr.new_recording` with the batching of `batcher`, the SDK's defaults if `None`.
+
+    rerun-sdk 0.18 only reads batcher settings from the environment, when a recording is created, so the
+    environment is changed (under a lock) for the time it takes to create the recording.
+
+    The environment is shared by the whole process, and the lock only keeps out other calls of this function: other
+    threads may see the batcher settings meanwhile (e.g. a subprocess started with a copy of the environment), and
+    recordings created with `rr.new_recording` directly may get them. So all recordings are created here.
+    """
+    env = batcher.env() if batcher is not None else {}
+    with _env_lock:
+        saved = {name: os.environ.get(name) for name in env}
+        os.environ.update(env)
+        try:
+            return rr.new_recording(application_id, **kwargs)  # type: ignore[arg-type]
+        finally:
+            for name, value in saved.items():
+                if value is None:
+                    del os.environ[name]
+                else:
+                    os.environ[name] = value
+
+
+def flush(recording: rr.RecordingStream | None = None) -> None:
+    """Blocks until everything logged to `recording` (the current recording by default) reached its sink."""
+    recording = rr.get_data_recording(recording)
+    if recording is not None:
+        rerun_bindings.flush(blocking=True, recording=rr.RecordingStream.to_native(recording))
@@ -0,0 +1,373 @@
+#!/usr/bin/env python3
+"""
+Converts many episodes of a dataset at once, e.g. to fill the app's recording cache ahead of time.
+
+By default episodes are converted like the app converts them by default (quick previews, with compressed images),
+so that the app finds them in the cache.
+
+Episodes are spread over a pool of worker processes. Each worker loads the dataset once and then
+converts episodes one after the other, into the same recording cache the app uses (`tmp/` by default),
+so episodes that are already converted are skipped. With `--merge` all episodes are instead combined
+into a single recording, with an `episode` timeline.
+
+A manifest with the time and size of every episode is written next to the recordings.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+import rerun as rr
+from datasets import load_dataset
+from tqdm import tqdm
+
+from batching import FILE_BATCHER, BatcherOptions
+from dataset_conversion import (
+    DEFAULT_TIME_COLUMNS,
+    QUICK_PREVIEW,
+    VIDEO_JPEG_QUALITY,
+    Preview,
+    is_lerobot_dataset,
+    log_dataset_to_rerun,
+    log_lerobot_dataset_to_rerun,
+    recording_key,
+    recording_to_file,
+)
+from episode_index import dataset_revision, load_episode_index
+from main import (
+    add_batcher_arguments,
+    add_pipeline_arguments,
+    add_preview_arguments,
+    batcher_from_args,
+    pipeline_from_args,
+    preview_from_args,
+)
+from pipeline import PipelineOptions
+from profiling import Profile
+from rrd_cache import RrdCache
+
+if TYPE_CHECKING:
+    from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+
+logger = logging.getLogger(__name__)
+
+# The timeline episodes are logged on in merged recordings:
+EPISODE_TIMELINE = "episode"
+
+
+@dataclass(frozen=True)
+class ConversionOptions:
+    batch_size: int = 0
+    encoded_images: bool = True
+    jpeg_quality: int | None = VIDEO_JPEG_QUALITY
+    prefetch_rows: int = 16
+    preview: Preview | None = QUICK_PREVIEW
+    pipeline: PipelineOptions | None = None
+    profile: bool = False  # add the time spent in each stage to the manifest
+    time_columns: tuple[str, ...] = tuple(sorted(DEFAULT_TIME_COLUMNS))
+    batcher: BatcherOptions = FILE_BATCHER
+
+
+class EpisodeSource:
+    """A dataset that is loaded once, to convert any number of its episodes."""
+
+    def __init__(self, dataset_id: str, revision: str | None, cache_dir: Path) -> None:
+        self.dataset_id = dataset_id
+        self.revision = revision
+        if is_lerobot_dataset(dataset_id):
+            from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+
+            self.lerobot_dataset: LeRobotDataset | None = LeRobotDataset(dataset_id)
+        else:
+            self.lerobot_dataset = None
+            self.dataset = load_dataset(dataset_id, split="train", streaming=True, revision=revision)
+            self.index = load_episode_index(self.dataset, dataset_id, revision, cache_dir / "episode_index")
+
+    def episodes(self) -> list[int]:
+        if self.lerobot_dataset is not None:
+            return list(range(len(self.lerobot_dataset.episode_data_index["from"])))
+        if self.index.segments is None:
+            return [0]  # not split into episodes, the whole dataset is one
+        return sorted(self.index.segments)
+
+    def log_episode(
+        self,
+        episode_index: int,
+        options: ConversionOptions,
+        recording: rr.RecordingStream,
+        fixed_times: dict[str, int | float] | None = None,
+        profile: Profile | None = None,
+    ) -> int:
+        """Logs an episode to `recording`, returns the number of rows that were logged."""
+        rows_done = 0
+
+        def progress(rows: int, total_rows: int | None) -> None:
+            nonlocal rows_done
+            rows_done = rows
+
+        if self.lerobot_dataset is not None:
+            log_lerobot_dataset_to_rerun(
+                self.lerobot_dataset,
+                episode_index,
+                batch_size=options.batch_size,
+                prefetch_rows=options.prefetch_rows,
+                encoded_images=options.encoded_images,
+                jpeg_quality=options.jpeg_quality,
+                preview=options.preview,
+                fixed_times=fixed_times,
+                recording=recording,
+                progress=progress,
+                profile=profile,
+                pipeline=options.pipeline,
+                time_columns=options.time_columns,
+            )
+        else:
+            log_dataset_to_rerun(
+                self.index.select(self.dataset, episode_index),
+                batch_size=options.batch_size,
+                encoded_images=options.encoded_images,
+                preview=options.preview,
+                fixed_times=fixed_times,
+                recording=recording,
+                progress=progress,
+                profile=profile,
+                pipeline=options.pipeline,
+                time_columns=options.time_columns,
+            )
+        return rows_done
+
+
+# The dataset of this worker process, see `_init_worker`:
+_source: EpisodeSource | None = None
+
+
+def _init_worker(dataset_id: str, revision: str | None, cache_dir: Path) -> None:
+    global _source
+    # Forked workers inherit the dataset the parent already loaded.
+    if _source is None or _source.dataset_id != dataset_id or _source.revision != revision:
+        _source = EpisodeSource(dataset_id, revision, cache_dir)
+
+
+def _convert_episode(
+    episode_index: int,
+    options: ConversionOptions,
+    cache_dir: Path,
+    merge_dir: Path | None,
+    recording_id: str | None,
+) -> dict[str, Any]:
+    """Converts an episode in a worker process, returns its manifest entry."""
+    assert _source is not None
+    source = _source
+    entry: dict[str, Any] = {"episode_index": episode_index, "rows": None, "cached": False, "error": None}
+    profile = Profile() if options.profile else None
+    start_time = time.perf_counter()
+
+    try:
+        if merge_dir is not None:
+            path = merge_dir / f"{episode_index}.rrd"
+            with recording_to_file(path, recording_id=recording_id, batcher=options.batcher) as recording:
+                entry["rows"] = source.log_episode(
+                    episode_index, options, recording, fixed_times={EPISODE_TIMELINE: episode_index}, profile=profile
+                )
+        else:
+            key = recording_key(
+                source.dataset_id,
+                source.revision,
+                episode_index,
+                options.encoded_images,
+                options.jpeg_quality,
+                options.preview,
+                options.time_columns,
+            )
+            entry["cached"] = True
+
+            def create(filename: Path) -> None:
+                entry["cached"] = False
+                with recording_to_file(filename, batcher=options.batcher) as recording:
+                    entry["rows"] = source.log_episode(episode_index, options, recording, profile=profile)
+
+            path = RrdCache(cache_dir).get_or_create(key, create)
+        entry["path"] = path.as_posix()
+        entry["bytes"] = path.stat().st_size
+    except Exception as err:
+        logger.exception(f"Failed to convert episode {episode_index}")
+        entry["error"] = repr(err)
+
+    entry["seconds"] = time.perf_counter() - start_time
+    if profile is not None:
+        entry["profile"] = profile.report()
+    return entry
+
+
+def parse_episodes(spec: str) -> list[int] | None:
+    """Parses `all` (returns `None`), or a list of episodes and ranges like `0,3,10-19`."""
+    if spec == "all":
+        return None
+    episodes: list[int] = []
+    for part in spec.split(","):
+        first, _, last = part.partition("-")
+        episodes.extend(range(int(first), int(last or first) + 1))
+    return episodes
+
+
+def merge_recordings(paths: list[Path], output: Path) -> None:
+    """Merges `.rrd` files of the same recording into one."""
+    output.parent.mkdir(parents=True, exist_ok=True)
+    command = [sys.executable, "-m", "rerun", "rrd", "merge", *(path.as_posix() for path in paths)]
+    subprocess.run([*command, "--output", output.as_posix()], check=True)
+
+
+def convert_episodes(
+    dataset_id: str,
+    episodes: list[int] | None,
+    options: ConversionOptions,
+    cache_dir: Path,
+    num_workers: int,
+    merge_output: Path | None = None,
+) -> dict[str, Any]:
+    """
+    Converts `episodes` (all of them if `None`) on `num_workers` processes, and returns the manifest.
+
+    `merge_output`: if given, all episodes are merged into this one recording, instead of one recording
+    per episode in the cache.
+    """
+    revision = dataset_revision(dataset_id)
+    start_time = time.perf_counter()
+
+    if episodes is None:
+        _init_worker(dataset_id, revision, cache_dir)
+        assert _source is not None
+        episodes = _source.episodes()
+
+    with tempfile.TemporaryDirectory(dir=cache_dir if cache_dir.exists() else None) as tmp_dir:
+        merge_dir = Path(tmp_dir) if merge_output is not None else None
+        recording_id = str(uuid.uuid4()) if merge_output is not None else None
+
+        entries = []
+        with ProcessPoolExecutor(
+            max_workers=num_workers, initializer=_init_worker, initargs=(dataset_id, revision, cache_dir)
+        ) as executor:
+            futures = [
+                executor.submit(_convert_episode, episode_index, options, cache_dir, merge_dir, recording_id)
+                for episode_index in episodes
+            ]
+            for future in tqdm(as_completed(futures), total=len(futures), desc="Episodes"):
+                entries.append(future.result())
+        entries.sort(key=lambda entry: entry["episode_index"])
+
+        if merge_output is not None:
+            merge_recordings([Path(entry["path"]) for entry in entries if entry["error"] is None], merge_output)
+            for entry in entries:
+                entry["path"] = None  # only the merged recording is kept
+
+    manifest: dict[str, Any] = {
+        "dataset_id": dataset_id,
+        "revision": revision,
+        "options": asdict(options),
+        "num_workers": num_workers,
+        "seconds": time.perf_counter() - start_time,
+        "episodes": entries,
+    }
+    if merge_output is not None:
+        manifest["merged"] = {"path": merge_output.as_posix(), "bytes": merge_output.stat().st_size}
+    return manifest
+
+
+def main() -> None:
+    # Ensure the logging gets written to stderr:
+    logging.getLogger().addHandler(logging.StreamHandler())
+    logging.getLogger().setLevel(logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Convert many episodes of a HuggingFace dataset to Rerun recordings.")
+    parser.add_argument("--dataset", default="lerobot/pusht", help="The name of the dataset to load")
+    parser.add_argument("--episodes", default="all", help="`all`, or episodes and ranges like `0,3,10-19`")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Number of worker processes")
+    parser.add_argument(
+        "--cache-dir", type=Path, default=Path("tmp"), help="The recording cache to fill, the app uses `tmp`"
+    )
+    parser.add_argument("--merge", type=Path, help="Merge all episodes into this one recording instead")
+    parser.add_argument("--manifest", type=Path, help="Where to write the manifest, defaults to the cache directory")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="Send scalar and bar-chart columns in batches of this many rows (0 logs row by row)",
+    )
+    parser.add_argument(
+        "--raw-images",
+        dest="encoded_images",
+        action="store_false",
+        help="Log images as raw pixels, instead of the encoded (e.g. PNG or JPEG) files they are stored as",
+    )
+    parser.add_argument(
+        "--jpeg-quality",
+        type=int,
+        help=f"Compress video frames to JPEG with this quality ({VIDEO_JPEG_QUALITY} unless `--raw-images` is given)",
+    )
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Convert whole episodes, rather than the quick previews the app shows by default",
+    )
+    parser.add_argument(
+        "--profile", action="store_true", help="Add the time spent in each stage of every conversion to the manifest"
+    )
+    parser.add_argument(
+        "--time-columns",
+        nargs="+",
+        default=sorted(DEFAULT_TIME_COLUMNS),
+        help="The columns to log as timelines, if the dataset has them",
+    )
+    add_preview_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_batcher_arguments(parser, default="file")
+    args = parser.parse_args()
+
+    # The app's defaults unless told otherwise, so that the app finds the recordings in its cache:
+    jpeg_quality = args.jpeg_quality
+    if jpeg_quality is None and args.encoded_images:
+        jpeg_quality = VIDEO_JPEG_QUALITY
+    preview = preview_from_args(args) or (None if args.full else QUICK_PREVIEW)
+    options = ConversionOptions(
+        batch_size=args.batch_size,
+        encoded_images=args.encoded_images,
+        jpeg_quality=jpeg_quality,
+        preview=preview,
+        pipeline=pipeline_from_args(args),
+        profile=args.profile,
+        time_columns=tuple(args.time_columns),
+        batcher=batcher_from_args(args),
+    )
+    args.cache_dir.mkdir(parents=True, exist_ok=True)
+    manifest = convert_episodes(
+        args.dataset, parse_episodes(args.episodes), options, args.cache_dir, args.workers, args.merge
+    )
+
+    manifest_path = args.manifest or args.cache_dir / f"{args.dataset.replace('/', '_')}_manifest.json"
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2)
+
+    failed = [entry["episode_index"] for entry in manifest["episodes"] if entry["error"] is not None]
+    logger.info(
+        f"Converted {len(manifest['episodes']) - len(failed)} episodes in {manifest['seconds']:.1f}s, "
+        f"manifest written to {manifest_path}"
+    )
+    if failed:
+        logger.error(f"Failed to convert episodes {failed}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,146 +1,1293 @@
 from __future__ import annotations
 
+import io
+import itertools
 import logging
-from pathlib import PosixPath
-from typing import Any
+import math
+import mimetypes
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack, closing, contextmanager, nullcontext
+from dataclasses import asdict, dataclass, replace
+from functools import partial
+from pathlib import Path, PosixPath
+from typing import TYPE_CHECKING, Any, Callable, Collection, Iterator, NamedTuple, Sized
 
-import cv2
+import datasets
 import numpy as np
+import numpy.typing as npt
+import pyarrow as pa
+import pyarrow.compute as pc
 import rerun as rr
-import torch
-from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
-from PIL import Image
+from datasets import Dataset, Features, IterableDataset
+from datasets.formatting import Formatter, get_formatter
+from rerun._baseclasses import ComponentBatchMixin
+from rerun._unions import build_dense_union
 from tqdm import tqdm
 
+from batching import BatcherOptions, flush, new_recording
+from episode_index import select_lerobot_episode
+from pipeline import PipelineOptions, map_ordered, read_ahead
+from profiling import Profile, archetype_bytes
+from rrd_cache import RrdCache
+from video_decoder import DEFAULT_CACHE_BYTES, FrameEncoder, FramePrefetcher, VideoFrameCache, is_video_frame
+
+# Heavy imports are deferred to where they are needed, so that e.g. converting a dataset without any
+# tensors or images never imports `torch` or `PIL`:
+if TYPE_CHECKING:
+    from lerobot.common.datasets.lerobot_dataset import LeRobotDataset
+    from PIL import Image
+
 logger = logging.getLogger(__name__)
 
+# Bump this whenever the logged output changes, to invalidate previously converted recordings.
+CONVERTER_VERSION = 3
+
+
+@contextmanager
+def recording_to_file(
+    path: Path,
+    application_id: str = "dataset",
+    recording_id: str | None = None,
+    batcher: BatcherOptions | None = None,
+) -> Iterator[rr.RecordingStream]:
+    """
+    A new recording that is saved to `path`, flushed and closed on exit.
+
+    A recording per conversion, so that concurrent conversions don't log into each other's files.
+    `batcher`: how logged data is batched into chunks, the SDK's defaults if not given.
+    """
+    # rerun-sdk 0.18 only saves recordings that are the global or thread-local default, hence `make_thread_default`.
+    recording = new_recording(application_id, batcher, recording_id=recording_id, make_thread_default=True)
+    rr.save(path.as_posix(), recording=recording)
+    try:
+        yield recording
+    finally:
+        rr.disconnect(recording=recording)
+        rr.set_thread_local_data_recording(None)  # type: ignore[arg-type]  # clears it, but isn't typed as optional
+
+
+def is_lerobot_dataset(dataset_id: str) -> bool:
+    """Whether `dataset_id` is a LeRobot dataset (https://huggingface.co/lerobot), which has its own loader."""
+    return "/" in dataset_id and dataset_id.split("/")[0] == "lerobot"
+
 
-def get_frame(
-    video_path: PosixPath, timestamp: float, video_cache: dict[PosixPath, tuple[np.ndarray, float]] | None = None
-) -> np.ndarray:
+def get_frame(video_path: PosixPath, timestamp: float, video_cache: VideoFrameCache | None = None) -> npt.NDArray[Any]:
     """
-    Extracts a specific frame from a video.
+    Extracts a specific frame from a video, in BGR channel order.
 
     `video_path`: path to the video.
     `timestamp`: timestamp of the wanted frame.
-    `video_cache`: cache to prevent reading the same video file twice.
+    `video_cache`: cache of decoded frames and open videos, to avoid decoding the same frame twice.
     """
 
     if video_cache is None:
-        video_cache = {}
-    if video_path not in video_cache:
-        cap = cv2.VideoCapture(str(video_path))
-        frames = []
-        while cap.isOpened():
-            success, frame = cap.read()
-            if success:
-                frames.append(frame)
-            else:
-                break
-        frame_rate = cap.get(cv2.CAP_PROP_FPS)
-        video_cache[video_path] = (frames, frame_rate)
-
-    frames, frame_rate = video_cache[video_path]
-    return frames[int(timestamp * frame_rate)]
+        video_cache = VideoFrameCache()
+    return video_cache.get_frame(video_path, timestamp)
 
 
-def to_rerun(
-    column_name: str,
-    value: Any,
-    video_cache: dict[PosixPath, tuple[np.ndarray, float]] | None = None,
-    videos_dir: PosixPath | None = None,
-) -> Any:
-    """Do our best to interpret the value and convert it to a Rerun-compatible archetype."""
-    if isinstance(value, Image.Image):
+def is_encoded_image(value: Any) -> bool:
+    """Whether `value` is an image that `datasets` didn't decode: a `{"bytes": …, "path": …}` dict."""
+    return isinstance(value, dict) and "bytes" in value and "path" in value
+
+
+def disable_image_decoding(dataset: Any) -> Any:
+    """
+    Have `dataset` return its image columns as the encoded (e.g. PNG or JPEG) files they are stored as.
+
+    See `is_encoded_image`. Only changes how the columns are read, nothing is re-written.
+    """
+    features = getattr(dataset, "features", None)
+    if features is None:
+        return dataset  # not a `datasets` dataset, or a streaming one with unknown features
+    for column_name, feature in features.items():
+        if isinstance(feature, datasets.Image) and feature.decode:
+            dataset = dataset.cast_column(column_name, datasets.Image(decode=False))
+    return dataset
+
+
+def _is_tensor(value: Any) -> bool:
+    # Only values made by an imported `torch` can be tensors, so there is no need to import it to check.
+    torch = sys.modules.get("torch")
+    return torch is not None and isinstance(value, torch.Tensor)
+
+
+# Element types that Rerun stores tensors and images in, values of any other type are converted:
+RERUN_DTYPES = frozenset(
+    np.dtype(name)
+    for name in (
+        "uint8",
+        "uint16",
+        "uint32",
+        "uint64",
+        "int8",
+        "int16",
+        "int32",
+        "int64",
+        "float16",
+        "float32",
+        "float64",
+    )
+)
+
+# The number of copies `as_array` made on each thread, see `_convert_row`:
+_copies = threading.local()
+
+
+def as_array(value: Any) -> npt.NDArray[Any]:
+    """
+    A NumPy array of a tensor, an array or a (nested) list of numbers, of an element type Rerun supports.
+
+    Raises `ValueError` (or `TypeError`) for values that aren't (rectangular) arrays of numbers.
+
+    Tensors and arrays are viewed rather than copied, unless they aren't on the CPU or are of a type
+    Rerun doesn't support (like `bfloat16`, big-endian or `float128`). Lists are converted in one step.
+    Arrays aren't made contiguous here, since Rerun copies them into a contiguous buffer anyway.
+    """
+    copied = False
+    if isinstance(value, np.ndarray):
+        array = value
+    elif _is_tensor(value):
+        torch = sys.modules["torch"]
+        tensor = value.detach()
+        if tensor.dtype == torch.bfloat16:  # NumPy has no `bfloat16`
+            tensor, copied = tensor.float(), True
+        if tensor.device.type != "cpu":
+            tensor, copied = tensor.cpu(), True
+        array = tensor.numpy()  # shares memory with the tensor
+    else:
+        array, copied = np.asarray(value), True  # raises for ragged lists
+
+    if array.dtype.kind in "USV":
+        raise ValueError(f"Expected numbers, got an array of {array.dtype}")
+    if array.dtype == np.bool_:
+        array = array.view(np.uint8)  # same bytes, no copy
+    elif array.dtype not in RERUN_DTYPES:
+        native = array.dtype.newbyteorder("=")
+        array, copied = array.astype(native if native in RERUN_DTYPES else np.float64), True
+
+    if copied:
+        _copies.count = getattr(_copies, "count", 0) + 1
+    return array
+
+
+def _numeric_list_dims(value: list[Any]) -> int:
+    """The number of dimensions of a (nested) list of numbers, or 0 if it is empty or holds anything else."""
+    dims = 0
+    while isinstance(value, list):
+        if not value:
+            return 0
+        value, dims = value[0], dims + 1
+    return dims if isinstance(value, (int, float, np.number)) else 0
+
+
+def _is_pil_image(value: Any) -> bool:
+    pil_image = sys.modules.get("PIL.Image")
+    return pil_image is not None and isinstance(value, pil_image.Image)
+
+
+def decode_image(value: dict[str, Any]) -> Image.Image:
+    """Decode an encoded image, see `is_encoded_image`."""
+    from PIL import Image
+
+    if value["bytes"] is not None:
+        return Image.open(io.BytesIO(value["bytes"]))
+    return Image.open(value["path"])
+
+
+def column_kind(column_name: str, value: Any) -> str:
+    """Do our best to decide how a value should be logged, see `CONVERTERS` for the possible kinds."""
+    if is_encoded_image(value):
+        if "depth" in column_name:
+            return "depth_image"  # depth images are decoded, Rerun can't show encoded depth
+        else:
+            return "encoded_image"
+    elif _is_pil_image(value):
         if "depth" in column_name:
-            return rr.DepthImage(value)
+            return "depth_image"
         else:
-            return rr.Image(value)
+            return "image"
     elif isinstance(value, np.ndarray):
-        return rr.Tensor(value)
+        return "tensor"
     elif isinstance(value, list):
-        if isinstance(value[0], float):
-            return rr.BarChart(value)
+        dims = _numeric_list_dims(value)
+        if dims == 1:
+            return "bar_chart"
+        elif dims > 1:
+            return "tensor"
         else:
-            return rr.TextDocument(str(value))  # Fallback to text
+            return "text"  # Fallback to text
     elif isinstance(value, float) or isinstance(value, int):
-        return rr.Scalar(value)
-    elif isinstance(value, torch.Tensor):
+        return "scalar"
+    elif _is_tensor(value):
         if value.dim() == 0:
-            return rr.Scalar(value.item())
+            return "scalar"
         elif value.dim() == 1:
-            return rr.BarChart(value)
+            return "bar_chart"
         elif value.dim() == 2 and "depth" in column_name:
-            return rr.DepthImage(value)
+            return "depth_image"
         elif value.dim() == 2:
-            return rr.Image(value)
+            return "image"
         elif value.dim() == 3 and (value.shape[2] == 3 or value.shape[2] == 4):
-            return rr.Image(value)  # Treat it as a RGB or RGBA image
+            return "image"  # Treat it as a RGB or RGBA image
         else:
-            return rr.Tensor(value)
-    elif isinstance(value, dict) and "path" in value and "timestamp" in value:
-        path = (videos_dir or PosixPath("./")) / PosixPath(value["path"])
-        timestamp = value["timestamp"]
-        return rr.Image(get_frame(path, timestamp, video_cache=video_cache))
+            return "tensor"
+    elif is_video_frame(value):
+        return "video_frame"
     else:
-        return rr.TextDocument(str(value))  # Fallback to text
+        return "text"  # Fallback to text
 
 
-def log_lerobot_dataset_to_rerun(dataset: LeRobotDataset, episode_index: int) -> None:
-    # Special time-like columns for LeRobot datasets (https://huggingface.co/lerobot/):
-    TIME_LIKE = {"index", "frame_id", "timestamp"}
+def _to_scalar(value: Any) -> rr.Scalar:
+    return rr.Scalar(value.item() if _is_tensor(value) else value)
 
-    # Ignore these columns (again, LeRobot-specific):
-    IGNORE = {"episode_data_index_from", "episode_data_index_to", "episode_id"}
 
-    hf_ds_subset = dataset.hf_dataset.filter(
-        lambda frame: "episode_index" not in frame or frame["episode_index"] == episode_index
-    )
+def _to_text(value: Any) -> rr.TextDocument:
+    return rr.TextDocument(str(value))
+
+
+def _to_image(value: Any) -> rr.Image:
+    return rr.Image(value if _is_pil_image(value) else as_array(value))
+
+
+def _to_tensor(value: Any) -> rr.Tensor | rr.TextDocument:
+    try:
+        return rr.Tensor(as_array(value))
+    except (ValueError, TypeError):
+        return _to_text(value)  # e.g. ragged or mixed lists, that only start like a tensor
+
+
+def _to_bar_chart(value: Any) -> rr.BarChart | rr.TextDocument:
+    try:
+        return rr.BarChart(as_array(value))
+    except (ValueError, TypeError):
+        return _to_text(value)
+
+
+# Magic bytes of the encodings Rerun can show, for images stored without a file name:
+IMAGE_SIGNATURES = {b"\x89PNG\r\n\x1a\n": "image/png", b"\xff\xd8\xff": "image/jpeg"}
+
+
+def _image_media_type(value: dict[str, Any]) -> str | None:
+    if value["path"]:
+        media_type = mimetypes.guess_type(value["path"])[0]
+        if media_type is not None:
+            return media_type
+    if value["bytes"] is not None:
+        for signature, media_type in IMAGE_SIGNATURES.items():
+            if value["bytes"].startswith(signature):
+                return media_type
+    return None
+
+
+def _to_encoded_image(value: dict[str, Any]) -> rr.EncodedImage | rr.Image:
+    media_type = _image_media_type(value)
+    if media_type is None:
+        return rr.Image(decode_image(value))  # an encoding we can't tell, let PIL figure it out
+    if value["bytes"] is not None:
+        return rr.EncodedImage(contents=value["bytes"], media_type=media_type)
+    return rr.EncodedImage(path=value["path"], media_type=media_type)
+
+
+def _to_depth_image(value: Any) -> rr.DepthImage:
+    if is_encoded_image(value):
+        return rr.DepthImage(decode_image(value))
+    return rr.DepthImage(value if _is_pil_image(value) else as_array(value))
+
+
+def downscale_image(image: Any, max_size: int, nearest: bool = False) -> Any:
+    """
+    Shrink an image so that neither side is larger than `max_size` pixels, keeping its aspect ratio.
+
+    `image`: a PIL image, an encoded image (which is decoded, see `is_encoded_image`), or an array of
+    shape `(height, width, …)`.
+    `nearest`: use nearest-neighbor sampling, for images whose values mustn't be blended (like depth).
+    """
+    if is_encoded_image(image):
+        image = decode_image(image)
+
+    if _is_pil_image(image):
+        from PIL import Image
+
+        if max(image.size) <= max_size:
+            return image
+        image = image.copy()
+        image.thumbnail((max_size, max_size), Image.Resampling.NEAREST if nearest else Image.Resampling.BILINEAR)
+        return image
+
+    import cv2
+
+    array = as_array(image)
+    height, width = array.shape[:2]
+    if max(height, width) <= max_size:
+        return image
+    scale = max_size / max(height, width)
+    size = (max(1, round(width * scale)), max(1, round(height * scale)))
+    return cv2.resize(array, size, interpolation=cv2.INTER_NEAREST if nearest else cv2.INTER_AREA)
 
-    video_cache: dict[PosixPath, tuple[np.ndarray, float]] = {}
 
-    for row in tqdm(hf_ds_subset):
-        # Handle time-like columns first, since they set a state (time is an index in Rerun):
-        for column_name in TIME_LIKE:
+def _to_downscaled_image(value: Any, max_size: int) -> rr.Image:
+    return rr.Image(downscale_image(value, max_size))
+
+
+def _to_downscaled_depth_image(value: Any, max_size: int) -> rr.DepthImage:
+    return rr.DepthImage(downscale_image(value, max_size, nearest=True))
+
+
+# How each kind of value is converted to a Rerun archetype.
+# Video frames are missing here, since they need to be decoded first (see `get_frame`).
+CONVERTERS: dict[str, Callable[[Any], Any]] = {
+    "image": _to_image,
+    "encoded_image": _to_encoded_image,
+    "depth_image": _to_depth_image,
+    "tensor": _to_tensor,
+    "bar_chart": _to_bar_chart,
+    "scalar": _to_scalar,
+    "text": _to_text,
+}
+
+# Converters of the kinds that are downscaled in previews, taking the max image size as second argument:
+DOWNSCALING_CONVERTERS: dict[str, Callable[[Any, int], Any]] = {
+    "image": _to_downscaled_image,
+    "encoded_image": _to_downscaled_image,
+    "depth_image": _to_downscaled_depth_image,
+}
+
+
+def to_rerun(
+    column_name: str,
+    value: Any,
+    video_cache: VideoFrameCache | None = None,
+    videos_dir: PosixPath | None = None,
+) -> Any:
+    """Do our best to interpret the value and convert it to a Rerun-compatible archetype."""
+    kind = column_kind(column_name, value)
+    if kind == "video_frame":
+        return _video_frame_to_rerun(value, video_cache, videos_dir)
+    return CONVERTERS[kind](value)
+
+
+def _video_frame_to_rerun(
+    value: dict[str, Any], video_cache: VideoFrameCache | None = None, videos_dir: PosixPath | None = None
+) -> rr.Image:
+    path = (videos_dir or PosixPath("./")) / PosixPath(value["path"])
+    timestamp = value["timestamp"]
+    return rr.Image(_bgr_to_rgb(get_frame(path, timestamp, video_cache=video_cache)))
+
+
+def _bgr_to_rgb(frame: npt.NDArray[Any]) -> npt.NDArray[Any]:
+    # OpenCV decodes to BGR, Rerun (0.18) only knows RGB color models.
+    return frame[..., ::-1]
+
+
+def _decode_frames(
+    items: Iterator[_RowItem],
+    video_cache: VideoFrameCache,
+    videos_dir: PosixPath,
+    transform: Callable[[npt.NDArray[Any]], npt.NDArray[Any]] | None = None,
+) -> Iterator[tuple[_RowItem, dict[str, npt.NDArray[Any]]]]:
+    """Yields every item with the decoded frames of its video columns, like `FramePrefetcher.iter_rows` does."""
+    for item in items:
+        frames = {}
+        for column in item.columns:
+            if column.kind == "video_frame":
+                cell = item.row[column.column_name]
+                frame = get_frame(videos_dir / PosixPath(cell["path"]), cell["timestamp"], video_cache)
+                frames[column.column_name] = frame if transform is None else transform(frame)
+        yield item, frames
+
+
+@dataclass(frozen=True)
+class ColumnPlan:
+    column_name: str
+    kind: str
+    convert: Callable[[Any], Any] | None  # `None` for video frames
+
+
+class ConversionPlan:
+    """
+    Decides once per dataset how each column is logged, so that rows don't need to be inspected cell by cell.
+
+    The plan is made from the first row rather than from the dataset's `features`, since transforms
+    (like LeRobot's conversion to torch) change the types of the values that are actually returned.
+
+    `time_columns`: timeline name to `"sequence"` or `"seconds"`.
+    `columns`: the data columns to log, in order.
+    """
+
+    def __init__(self, time_columns: dict[str, str], columns: list[ColumnPlan]) -> None:
+        self.time_columns = time_columns
+        self.columns = columns
+
+    @classmethod
+    def from_row(
+        cls,
+        row: dict[str, Any],
+        time_like: set[str],
+        ignore: set[str] | None = None,
+        max_image_size: int | None = None,
+    ) -> ConversionPlan:
+        """`max_image_size`: if given, images are downscaled so that neither side is larger than this."""
+        time_columns = {}
+        for column_name in sorted(time_like):
             if column_name in row:
-                cell = row[column_name]
-                if isinstance(cell, torch.Tensor) and cell.dim() == 0:
-                    cell = cell.item()
+                cell = _time_cell(row[column_name])
                 if isinstance(cell, int):
-                    rr.set_time_sequence(column_name, cell)
+                    time_columns[column_name] = "sequence"
                 elif isinstance(cell, float):
-                    rr.set_time_seconds(column_name, cell)  # assume seconds
+                    time_columns[column_name] = "seconds"  # assume seconds
                 else:
-                    print(f"Unknown time-like column {column_name} with value {cell}")
+                    logger.warning(f"Unknown time-like column {column_name} with value {row[column_name]}")
 
-        # Now log actual data columns:
+        columns = []
         for column_name, cell in row.items():
-            if column_name in TIME_LIKE or column_name in IGNORE:
+            if column_name in time_like or (ignore is not None and column_name in ignore):
                 continue
-            else:
-                rr.log(
-                    column_name,
-                    to_rerun(column_name, cell, video_cache=video_cache, videos_dir=dataset.videos_dir.parent),
-                )
+            kind = column_kind(column_name, cell)
+            convert = CONVERTERS.get(kind)
+            if max_image_size is not None and kind in DOWNSCALING_CONVERTERS:
+                convert = partial(DOWNSCALING_CONVERTERS[kind], max_size=max_image_size)
+            columns.append(ColumnPlan(column_name, kind, convert))
 
+        return cls(time_columns, columns)
 
-def log_dataset_to_rerun(dataset: Any) -> None:
-    TIME_LIKE = {"index", "frame_id", "timestamp"}
+    def row_times(self, row: dict[str, Any]) -> dict[str, int | float]:
+        """The time of a row on each timeline."""
+        times: dict[str, int | float] = {}
+        for column_name, time_kind in self.time_columns.items():
+            cell = _time_cell(row[column_name])
+            if cell is not None and not (isinstance(cell, float) and math.isnan(cell)):
+                times[column_name] = int(cell) if time_kind == "sequence" else float(cell)
+        return times
 
-    for row in tqdm(dataset):
-        # Handle time-like columns first, since they set a state (time is an index in Rerun):
-        for column_name in TIME_LIKE:
-            if column_name in row:
-                cell = row[column_name]
-                if isinstance(cell, int):
-                    rr.set_time_sequence(column_name, cell)
-                elif isinstance(cell, float):
-                    rr.set_time_seconds(column_name, cell)  # assume seconds
+    def describe(self) -> str:
+        """A human-readable summary of the plan."""
+        lines = [f"{column_name}: timeline ({kind})" for column_name, kind in self.time_columns.items()]
+        lines += [f"{column.column_name}: {column.kind}" for column in self.columns]
+        return "\n".join(lines)
+
+
+def _time_cell(cell: Any) -> int | float | None:
+    """Unwrap a time-like cell into a plain `int` (sequence) or `float` (seconds)."""
+    if _is_tensor(cell) and cell.dim() == 0:
+        cell = cell.item()
+    if isinstance(cell, (int, float)):
+        return cell
+    return None
+
+
+# The columns that are logged as timelines rather than as data, unless told otherwise (those of LeRobot datasets):
+DEFAULT_TIME_COLUMNS = frozenset({"index", "frame_id", "timestamp"})
+
+
+def check_timeline(name: str, values: npt.NDArray[Any]) -> bool:
+    """
+    Warns about times that will look wrong in the viewer: missing ones, or ones that aren't increasing.
+
+    Returns whether `values` are strictly increasing.
+    """
+    missing = _missing_times(values)
+    if missing.any():
+        logger.warning(f"Timeline {name} is missing {int(missing.sum())} of its times")
+        return False
+    steps = np.diff(values)
+    if (steps < 0).any():
+        logger.warning(f"Timeline {name} isn't sorted, it goes back in time {int((steps < 0).sum())} times")
+    elif (steps == 0).any():
+        logger.warning(f"Timeline {name} repeats {int((steps == 0).sum())} times, rows at the same time overlap")
+    return bool((steps > 0).all())
+
+
+def read_timelines(dataset: Dataset, time_columns: Collection[str]) -> dict[str, npt.NDArray[Any]]:
+    """
+    Reads the time columns of all rows at once, as arrays, and checks them with `check_timeline`.
+
+    Time columns that `dataset` doesn't have are skipped, and ones that don't hold numbers are skipped with a warning.
+    """
+    names = [name for name in sorted(time_columns) if name in dataset.column_names]
+    if not names:
+        return {}
+    table = dataset.select_columns(names).with_format("arrow")[:]
+
+    timelines = {}
+    for name in names:
+        values = table.column(name).to_numpy()
+        if values.dtype.kind not in "iuf":
+            logger.warning(f"Time column {name} holds {values.dtype} values rather than numbers, it is not a timeline")
+            continue
+        check_timeline(name, values)
+        timelines[name] = values
+    return timelines
+
+
+def _missing_times(values: npt.NDArray[Any]) -> npt.NDArray[Any]:
+    """Which of `values` are missing, as nulls become NaN when read into arrays."""
+    missing: npt.NDArray[Any] = np.isnan(values) if values.dtype.kind == "f" else np.zeros(len(values), dtype=bool)
+    return missing
+
+
+def _times_per_row(
+    time_columns: dict[str, str], timelines: dict[str, npt.NDArray[Any]]
+) -> list[dict[str, int | float]]:
+    """
+    The time of every row on each timeline, from arrays of times.
+
+    `time_columns`: timeline name to `"sequence"` or `"seconds"`, see `ConversionPlan`. Missing times are left
+    out of their rows, like `ConversionPlan.row_times` does.
+    """
+    values: dict[str, list[int | float | None]] = {}
+    for name, kind in time_columns.items():
+        times = timelines[name]
+        missing = _missing_times(times)
+        if not missing.any():
+            values[name] = times.astype(np.int64 if kind == "sequence" else np.float64).tolist()
+            continue
+        known = np.where(missing, 0, times).astype(np.int64 if kind == "sequence" else np.float64).tolist()
+        values[name] = [None if is_missing else time for time, is_missing in zip(known, missing.tolist())]
+    return [{name: time for name, time in zip(values, times) if time is not None} for times in zip(*values.values())]
+
+
+def _set_times(times: dict[str, int | float], recording: rr.RecordingStream | None = None) -> None:
+    for timeline, value in times.items():
+        if isinstance(value, int):
+            rr.set_time_sequence(timeline, value, recording=recording)
+        else:
+            rr.set_time_seconds(timeline, value, recording=recording)  # assume seconds
+
+
+# The timeline that time windows and rates of previews are measured on:
+PREVIEW_TIMELINE = "timestamp"
+
+
+@dataclass(frozen=True)
+class Preview:
+    """
+    Logs only part of a dataset, for a quick look.
+
+    Rows are selected before anything is decoded, so skipped rows cost (almost) nothing.
+
+    `stride`: keep every `stride`-th row.
+    `max_hz`: keep at most this many rows per second.
+    `start`, `end`: keep the rows in `[start, end)`, as row numbers (ints) or seconds (floats) from the first row.
+    `max_image_size`: downscale images (and video frames) so that neither side is larger than this.
+    """
+
+    stride: int = 1
+    max_hz: float | None = None
+    start: int | float | None = None
+    end: int | float | None = None
+    max_image_size: int | None = None
+
+    @property
+    def needs_times(self) -> bool:
+        """Whether rows are selected by their time, see `PREVIEW_TIMELINE`."""
+        return self.max_hz is not None or isinstance(self.start, float) or isinstance(self.end, float)
+
+
+# What the app converts unless asked otherwise, so also what tools that fill its cache convert by default (the
+# options are part of `recording_key`). JPEG quality of video frames, when images are kept compressed:
+VIDEO_JPEG_QUALITY = 90
+
+# What quick previews log, to get something on screen fast. The full recording is converted on request.
+QUICK_PREVIEW = Preview(max_hz=10.0, max_image_size=320)
+
+
+class _RowSelector:
+    """
+    Decides which rows a preview keeps, a batch of rows at a time.
+
+    Batches must be passed in order, since rates and strides carry over from one batch to the next.
+    """
+
+    def __init__(self, preview: Preview) -> None:
+        self.preview = preview
+        self._first_time: float | None = None
+        self._rows_in_window = 0
+        self._last_bucket: int | None = None
+
+    def __call__(self, indices: Any, times: Any = None) -> npt.NDArray[Any]:
+        """Returns whether to keep each row, given the row numbers and (if needed) times of a batch."""
+        preview = self.preview
+        indices = np.asarray(indices)
+        keep = np.ones(len(indices), dtype=bool)
+        if isinstance(preview.start, int):
+            keep &= indices >= preview.start
+        if isinstance(preview.end, int):
+            keep &= indices < preview.end
+
+        if preview.needs_times and len(indices) > 0:
+            times = np.asarray(times, dtype=np.float64)
+            if self._first_time is None:
+                self._first_time = float(times[0])
+            # Round to microseconds, so that e.g. float32 and float64 timestamps select the same rows.
+            times = np.round(times - self._first_time, 6)
+            if isinstance(preview.start, float):
+                keep &= times >= preview.start
+            if isinstance(preview.end, float):
+                keep &= times < preview.end
+
+        # Strides count from the start of the window:
+        if preview.stride > 1:
+            ranks = self._rows_in_window + np.cumsum(keep) - 1
+            self._rows_in_window += int(keep.sum())
+            keep &= ranks % preview.stride == 0
+
+        if preview.max_hz is not None and len(indices) > 0:
+            buckets = np.floor(times * preview.max_hz).astype(np.int64)
+            for i in np.flatnonzero(keep):
+                if buckets[i] == self._last_bucket:
+                    keep[i] = False
                 else:
-                    print(f"Unknown time-like column {column_name} with value {cell}")
+                    self._last_bucket = int(buckets[i])
 
-        # Now log actual data columns:
-        for column_name, cell in row.items():
-            if column_name in TIME_LIKE:
-                continue
-            rr.log(column_name, to_rerun(column_name, cell))
+        return keep
+
+
+def _without_times(preview: Preview) -> Preview:
+    """`preview` without what it selects rows by time with, for rows that have no times."""
+    logger.warning(f"There is no `{PREVIEW_TIMELINE}` column, so rows are only selected by their row number")
+    return replace(
+        preview,
+        max_hz=None,
+        start=None if isinstance(preview.start, float) else preview.start,
+        end=None if isinstance(preview.end, float) else preview.end,
+    )
+
+
+def select_preview_rows(dataset: Any, preview: Preview) -> Any:
+    """
+    The rows of `dataset` that `preview` keeps, selected without decoding any other column.
+
+    Datasets without a `PREVIEW_TIMELINE` column are previewed without the options that need times.
+    """
+    if preview.needs_times:
+        if isinstance(dataset, (Dataset, IterableDataset)):
+            column_names = dataset.column_names
+            if column_names is None:  # streaming datasets of unknown features
+                column_names = list(next(iter(dataset), {}))
+        else:
+            rows = iter(dataset)
+            first_row = next(rows, None)
+            column_names = list(first_row or {})
+            dataset = rows if first_row is None else itertools.chain([first_row], rows)
+        if PREVIEW_TIMELINE not in column_names:
+            preview = _without_times(preview)
+
+    select = _RowSelector(preview)
+    input_columns = [PREVIEW_TIMELINE] if preview.needs_times else []
+
+    if isinstance(dataset, Dataset):
+        times = dataset.with_format("arrow")[PREVIEW_TIMELINE].to_numpy() if input_columns else None
+        return dataset.select(np.flatnonzero(select(np.arange(len(dataset)), times)))
+    elif isinstance(dataset, IterableDataset):
+        if isinstance(preview.end, int):
+            dataset = dataset.take(preview.end)  # stop streaming once past the window
+        if input_columns:
+            return dataset.filter(
+                lambda times, indices: select(indices, times).tolist(),
+                batched=True,
+                with_indices=True,
+                input_columns=input_columns,
+            )
+        return dataset.filter(lambda _, indices: select(indices).tolist(), batched=True, with_indices=True)
+    else:
+        return (
+            row
+            for index, row in enumerate(dataset)
+            if select([index], [_time_cell(row[PREVIEW_TIMELINE])] if input_columns else None)[0]
+        )
+
+
+def recording_key(
+    dataset_id: str,
+    revision: str | None,
+    episode_index: int,
+    encoded_images: bool = False,
+    jpeg_quality: int | None = None,
+    preview: Preview | None = None,
+    time_columns: Collection[str] | None = None,
+    segment: tuple[int, int] | None = None,
+) -> str:
+    """
+    The `RrdCache` key of an episode converted with these options.
+
+    `segment`: the `[start, stop)` rows, for the key of a segment of a conversion (see `segments.py`).
+    """
+    options: dict[str, Any] = {}
+    # Left out by default, so the keys of recordings that are already cached don't change:
+    if time_columns is not None and set(time_columns) != DEFAULT_TIME_COLUMNS:
+        options["time_columns"] = sorted(time_columns)
+    if segment is not None:
+        options["segment"] = list(segment)
+        # Segments are joined as they are (see `segments.py`), so only ones written by the same SDK fit together:
+        options["rerun"] = rr.__version__
+    return RrdCache.key(
+        dataset_id,
+        revision,
+        episode_index,
+        CONVERTER_VERSION,
+        encoded_images=encoded_images,
+        jpeg_quality=jpeg_quality,
+        preview=asdict(preview) if preview is not None else None,
+        **options,
+    )
+
+
+# Kinds of columns that are sent as whole columns when logging in batches:
+BATCHABLE_KINDS = {"scalar", "bar_chart"}
+
+
+def _tensor_batch(values: npt.NDArray[Any], offsets: npt.NDArray[Any]) -> rr.components.TensorDataBatch:
+    """
+    A 1-D tensor per row, from the values of all rows back to back and where each row starts.
+
+    `offsets`: the start of every row in `values`, followed by the end of the last row.
+
+    rerun-sdk 0.18 only serializes one tensor at a time, so the Arrow array is built directly, in one go.
+    """
+    values = as_array(values)
+    lengths = np.diff(offsets).astype(np.uint64)
+    num_rows = len(lengths)
+    data_type = rr.components.TensorDataBatch._ARROW_TYPE.storage_type
+    shape_type = data_type.field("shape").type
+    dimension_type = shape_type.value_type
+    shape = pa.ListArray.from_arrays(
+        pa.array(np.arange(num_rows + 1, dtype=np.int32)),
+        pa.StructArray.from_arrays(
+            [pa.array(lengths), pa.nulls(num_rows, dimension_type.field("name").type)],
+            fields=list(dimension_type),
+        ),
+        type=shape_type,
+    )
+
+    # A union of a list type per element type, e.g. `F64` for `float64`:
+    variant = f"{'F' if values.dtype.kind == 'f' else values.dtype.kind.upper()}{values.dtype.itemsize * 8}"
+    buffer = build_dense_union(
+        data_type.field("buffer").type, variant, pa.ListArray.from_arrays(pa.array(offsets, pa.int32()), values)
+    )
+    return rr.components.TensorDataBatch(pa.StructArray.from_arrays([shape, buffer], fields=list(data_type)))
+
+
+def _send_columns(
+    column_name: str,
+    times: list[rr.TimeSequenceColumn | rr.TimeSecondsColumn],
+    component: ComponentBatchMixin,
+    recording: rr.RecordingStream | None = None,
+) -> int:
+    """
+    Send a batch of values of a component (e.g. scalars or tensors) with a single call.
+
+    `times`: the time of every value on each timeline.
+
+    Returns the number of bytes of data that were sent. Raises on data that can't be sent (e.g. a `ValueError`),
+    where `rr.send_columns` would only warn and drop the batch.
+    """
+    # rerun-sdk 0.18 `send_columns` passes `recording` straight to the bindings, so it must be unwrapped:
+    rr.send_columns(
+        column_name,
+        times=times,
+        components=[component],
+        recording=rr.RecordingStream.to_native(recording),  # type: ignore[arg-type]
+        strict=True,
+    )
+    return int(component.as_arrow_array().nbytes)
+
+
+class _Batch(ABC):
+    """A batch of rows that can be read column by column."""
+
+    num_rows: int
+
+    @abstractmethod
+    def first_row(self) -> dict[str, Any]: ...
+
+    @abstractmethod
+    def column(self, column_name: str) -> npt.NDArray[Any]:
+        """A column of numbers, as a 1-D array."""
+
+    @abstractmethod
+    def list_column(self, column_name: str) -> tuple[npt.NDArray[Any], npt.NDArray[Any]]:
+        """
+        A column of lists of numbers, as the values of all rows back to back and where each row starts.
+
+        The offsets end with the end of the last row. Missing lists are empty.
+        """
+
+    @abstractmethod
+    def rows(self, column_names: list[str]) -> list[dict[str, Any]]:
+        """The given columns, as Python values."""
+
+
+class _ArrowBatch(_Batch):
+    """
+    Rows of a `datasets` dataset, kept in Arrow format.
+
+    Numeric columns are read as contiguous arrays, without converting every value to a Python object.
+    Only `rows` converts (and decodes, e.g. images) values one by one.
+
+    `formatter`: the formatter of the dataset's format (e.g. `torch`, or LeRobot's transform), if any,
+    so that rows come out just like they do when iterating over the dataset.
+    """
+
+    def __init__(self, table: pa.Table, features: Features | None, formatter: Formatter | None = None) -> None:
+        self.table = table
+        self.features = features
+        self.formatter = formatter
+        self.num_rows = table.num_rows
+
+    def _to_rows(self, table: pa.Table) -> list[dict[str, Any]]:
+        if self.formatter is not None:
+            columns = self.formatter.format_batch(table)
+            return [{name: values[i] for name, values in columns.items()} for i in range(table.num_rows)]
+        rows: list[dict[str, Any]] = table.to_pylist()
+        if self.features is None:
+            return rows
+        return [self.features.decode_example(row) for row in rows]
+
+    def first_row(self) -> dict[str, Any]:
+        return self._to_rows(self.table.slice(0, 1))[0]
+
+    def column(self, column_name: str) -> npt.NDArray[Any]:
+        values: npt.NDArray[Any] = self.table.column(column_name).to_numpy()
+        return values
+
+    def list_column(self, column_name: str) -> tuple[npt.NDArray[Any], npt.NDArray[Any]]:
+        array = self.table.column(column_name).combine_chunks()
+        values = array.flatten().to_numpy(zero_copy_only=False)
+        lengths = pc.list_value_length(array).fill_null(0).to_numpy()
+        return values, np.concatenate([[0], np.cumsum(lengths)])
+
+    def rows(self, column_names: list[str]) -> list[dict[str, Any]]:
+        return self._to_rows(self.table.select(column_names))
+
+
+class _RowBatch(_Batch):
+    """Rows that are already Python dicts, for datasets that aren't backed by Arrow."""
+
+    def __init__(self, rows: list[dict[str, Any]]) -> None:
+        self._rows = rows
+        self.num_rows = len(rows)
+
+    def first_row(self) -> dict[str, Any]:
+        return self._rows[0]
+
+    def column(self, column_name: str) -> npt.NDArray[Any]:
+        return np.asarray([_time_cell(row[column_name]) for row in self._rows])
+
+    def list_column(self, column_name: str) -> tuple[npt.NDArray[Any], npt.NDArray[Any]]:
+        arrays = [as_array(row[column_name]).ravel() for row in self._rows]
+        return np.concatenate(arrays), np.concatenate([[0], np.cumsum([len(array) for array in arrays])])
+
+    def rows(self, column_names: list[str]) -> list[dict[str, Any]]:
+        return self._rows
+
+
+def _iter_batches(dataset: Any, batch_size: int) -> Iterator[_Batch]:
+    if isinstance(dataset, (Dataset, IterableDataset)):
+        formatter = None
+        if isinstance(dataset, Dataset) and dataset.format["type"] is not None:
+            formatter = get_formatter(
+                dataset.format["type"], features=dataset.features, **dataset.format["format_kwargs"]
+            )
+        for table in dataset.with_format("arrow").iter(batch_size=batch_size):
+            yield _ArrowBatch(table, dataset.features, formatter)
+    else:
+        rows = []
+        for row in dataset:
+            rows.append(row)
+            if len(rows) == batch_size:
+                yield _RowBatch(rows)
+                rows = []
+        if rows:
+            yield _RowBatch(rows)
+
+
+class _RowItem(NamedTuple):
+    plan: ConversionPlan
+    columns: list[ColumnPlan]  # the columns of `row` that still need to be logged
+    row: dict[str, Any]
+    times: dict[str, int | float]
+    rows_done: int
+
+
+def _iter_rows(
+    dataset: Any,
+    make_plan: Callable[[dict[str, Any]], ConversionPlan],
+    plan: ConversionPlan | None,
+    timelines: dict[str, npt.NDArray[Any]] | None = None,
+    profile: Profile | None = None,
+) -> Iterator[_RowItem]:
+    """
+    Yields every row, to be logged cell by cell.
+
+    `timelines`: the times of all rows, see `read_timelines`. If not given (or incomplete), the times are
+    read from every row instead.
+    """
+    rows = profile.timed("read", dataset) if profile is not None else dataset
+    row_times: list[dict[str, int | float]] | None = None
+    for rows_done, row in enumerate(rows, start=1):
+        if plan is None:
+            plan = make_plan(row)
+        if row_times is None and timelines is not None and plan.time_columns.keys() <= timelines.keys():
+            row_times = _times_per_row(plan.time_columns, timelines)
+        times = row_times[rows_done - 1] if row_times else plan.row_times(row)
+        yield _RowItem(plan, plan.columns, row, times, rows_done)
+
+
+def _send_batches(
+    dataset: Any,
+    batch_size: int,
+    make_plan: Callable[[dict[str, Any]], ConversionPlan],
+    plan: ConversionPlan | None,
+    fixed_times: dict[str, int | float],
+    recording: rr.RecordingStream | None = None,
+    profile: Profile | None = None,
+) -> Iterator[_RowItem]:
+    """
+    Reads `dataset` in batches and sends its scalar and bar-chart columns a batch at a time.
+
+    Yields the rows with the remaining columns, to be logged cell by cell. Batches without any remaining
+    columns yield a single empty row, to report progress.
+    """
+    rows_done = 0
+    indicators_logged: set[str] = set()  # bar charts are only logged as such once, statically
+    batches = _iter_batches(dataset, batch_size)
+    for batch in profile.timed("read", batches) if profile is not None else batches:
+        if plan is None:
+            plan = make_plan(batch.first_row())
+
+        timelines = {column_name: batch.column(column_name) for column_name in plan.time_columns}
+        if timelines and not any(_missing_times(times).any() for times in timelines.values()):
+            timeline_columns: list[rr.TimeSequenceColumn | rr.TimeSecondsColumn] = [
+                rr.TimeSequenceColumn(timeline, times)
+                if plan.time_columns[timeline] == "sequence"
+                else rr.TimeSecondsColumn(timeline, times)
+                for timeline, times in timelines.items()
+            ]
+            timeline_columns += [
+                rr.TimeSequenceColumn(timeline, np.full(batch.num_rows, fixed_time))
+                if isinstance(fixed_time, int)
+                else rr.TimeSecondsColumn(timeline, np.full(batch.num_rows, fixed_time))
+                for timeline, fixed_time in fixed_times.items()
+            ]
+            start_time = time.perf_counter()
+            num_bytes = 0
+            unbatched = []
+            for column in plan.columns:
+                try:
+                    if column.kind == "scalar":
+                        scalars = rr.components.ScalarBatch(batch.column(column.column_name).astype(np.float64))
+                        num_bytes += _send_columns(column.column_name, timeline_columns, scalars, recording)
+                    elif column.kind == "bar_chart":
+                        tensors = _tensor_batch(*batch.list_column(column.column_name))
+                        if column.column_name not in indicators_logged:
+                            rr.log(column.column_name, [rr.BarChart.indicator()], static=True, recording=recording)
+                            indicators_logged.add(column.column_name)
+                        num_bytes += _send_columns(column.column_name, timeline_columns, tensors, recording)
+                except (ValueError, TypeError):
+                    unbatched.append(column)  # e.g. ragged or mixed lists, logged cell by cell instead
+            if profile is not None:
+                profile.add("send_columns", time.perf_counter() - start_time)
+                profile.count("bytes_logged", num_bytes)
+            columns = [column for column in plan.columns if column.kind not in BATCHABLE_KINDS or column in unbatched]
+        else:
+            # Without a timeline, batched values would all land on the same time. Batches with missing times are
+            # logged row by row too, leaving the missing times out of their rows (see `_times_per_row`).
+            columns = plan.columns
+
+        if not columns:
+            rows_done += batch.num_rows
+            yield _RowItem(plan, [], {}, {}, rows_done)
+            continue
+
+        start_time = time.perf_counter()
+        rows = batch.rows([column.column_name for column in columns])
+        if profile is not None:
+            profile.add("read", time.perf_counter() - start_time)  # rows are only converted (and decoded) here
+        times_per_row = _times_per_row(plan.time_columns, timelines) if timelines else [{}] * len(rows)
+        for row, row_times in zip(rows, times_per_row):
+            rows_done += 1
+            yield _RowItem(plan, columns, row, row_times, rows_done)
+
+
+def _convert_row(
+    item: _RowItem,
+    frames: dict[str, Any],
+    to_archetype: Callable[[ColumnPlan, Any, dict[str, Any]], Any],
+    profile: Profile | None = None,
+) -> list[tuple[str, Any]]:
+    """Convert the remaining columns of a row with `to_archetype`, returns their entity paths and archetypes."""
+    if profile is None:
+        return [
+            (column.column_name, to_archetype(column, item.row[column.column_name], frames)) for column in item.columns
+        ]
+
+    start_time = time.perf_counter()
+    archetypes = []
+    for column in item.columns:
+        copies = getattr(_copies, "count", 0)
+        archetypes.append((column.column_name, to_archetype(column, item.row[column.column_name], frames)))
+        copies = getattr(_copies, "count", 0) - copies
+        if copies:
+            profile.count(f"copies/{column.column_name}", copies)  # made by `as_array`
+    if archetypes:
+        profile.add("convert", time.perf_counter() - start_time)  # per row rather than per cell, to keep overhead low
+    return archetypes
+
+
+def _log_row(
+    item: _RowItem,
+    archetypes: list[tuple[str, Any]],
+    recording: rr.RecordingStream | None = None,
+    profile: Profile | None = None,
+) -> None:
+    """Log a row converted by `_convert_row`."""
+    # Handle time-like columns first, since they set a state (time is an index in Rerun):
+    if item.columns:
+        _set_times(item.times, recording)
+        # A row without a time on a timeline isn't logged on it, rather than at the time of the row before:
+        for timeline in item.plan.time_columns.keys() - item.times.keys():
+            rr.disable_timeline(timeline, recording=recording)
+
+    # Now log actual data columns:
+    start_time = time.perf_counter()
+    for entity_path, archetype in archetypes:
+        rr.log(entity_path, archetype, recording=recording)
+    if profile is not None and archetypes:
+        profile.add("log", time.perf_counter() - start_time)
+        profile.count("bytes_logged", sum(archetype_bytes(archetype) for _, archetype in archetypes))
+
+
+def _log_items(
+    items: Iterator[tuple[_RowItem, dict[str, Any]]],
+    to_archetype: Callable[[ColumnPlan, Any, dict[str, Any]], Any],
+    total_rows: int | None,
+    pipeline: PipelineOptions,
+    fixed_times: dict[str, int | float],
+    recording: rr.RecordingStream | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+    profile: Profile | None = None,
+) -> ConversionPlan | None:
+    """
+    Convert and log rows (with the decoded frames of their video columns), in order.
+
+    Rows are converted on `pipeline.convert_workers` threads if set, and logged on this thread.
+    `fixed_times`: times every row is logged at, set once rather than for every row.
+    Returns the plan of the last row, `None` if there are no rows.
+    """
+    plan = None
+    rows_done = 0
+    _set_times(fixed_times, recording)
+    with ExitStack() as stack:
+        progress_bar = stack.enter_context(tqdm(total=total_rows))
+
+        def convert(item_with_frames: tuple[_RowItem, dict[str, Any]]) -> tuple[_RowItem, list[tuple[str, Any]]]:
+            item, frames = item_with_frames
+            return item, _convert_row(item, frames, to_archetype, profile)
+
+        converted: Iterator[tuple[_RowItem, list[tuple[str, Any]]]]
+        if pipeline.convert_workers > 0:
+            executor = stack.enter_context(
+                ThreadPoolExecutor(max_workers=pipeline.convert_workers, thread_name_prefix="convert")
+            )
+            converted = stack.enter_context(closing(map_ordered(convert, items, executor, pipeline.convert_ahead)))
+        else:
+            converted = map(convert, items)
+
+        for item, archetypes in converted:
+            plan = item.plan
+            _log_row(item, archetypes, recording, profile)
+
+            rows_done = item.rows_done
+            progress_bar.update(rows_done - progress_bar.n)
+            if progress is not None:
+                progress(rows_done, total_rows)
+
+    # Rather than whenever the batcher gets to it, so that the conversion is done once this returns:
+    with profile.span("flush") if profile is not None else nullcontext():
+        flush(recording)
+
+    if profile is not None:
+        profile.count("rows", rows_done)
+    return plan
+
+
+def log_lerobot_dataset_to_rerun(
+    dataset: LeRobotDataset,
+    episode_index: int,
+    batch_size: int = 0,
+    video_cache_bytes: int = DEFAULT_CACHE_BYTES,
+    prefetch_rows: int = 0,
+    encoded_images: bool = False,
+    jpeg_quality: int | None = None,
+    preview: Preview | None = None,
+    fixed_times: dict[str, int | float] | None = None,
+    recording: rr.RecordingStream | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+    plan: ConversionPlan | None = None,
+    profile: Profile | None = None,
+    pipeline: PipelineOptions | None = None,
+    time_columns: Collection[str] | None = None,
+) -> ConversionPlan | None:
+    """
+    Log a single episode of a LeRobot dataset to Rerun.
+
+    `batch_size`: if positive, the episode is read in Arrow batches of this many rows, and scalar and
+    bar-chart columns are sent a batch at a time.
+    `video_cache_bytes`: memory budget for decoded video frames.
+    `prefetch_rows`: if positive, video frames are decoded on background threads (one per camera),
+    up to this many rows ahead of logging.
+    `encoded_images`: log image columns as the encoded files they are stored as, instead of decoding them.
+    `jpeg_quality`: if given, video frames are compressed to JPEG with this quality (0 to 100) in worker
+    processes, instead of being logged as raw pixels.
+    `preview`: if given, only part of the episode is logged, see `Preview`.
+    `fixed_times`: times on additional timelines that every row is logged at, e.g. `{"episode": 3}`.
+    `recording`: the recording to log to, defaults to the current active recording. Everything is flushed
+    to its sink before returning, closing it is up to the caller.
+    `progress`: called after every row with the number of rows logged so far and the total number of rows.
+    It may raise to abort the conversion.
+    `plan`: how to log each column, made from the first row if not given.
+    `profile`: if given, the time spent in each stage of the conversion is added to it.
+    `pipeline`: which steps run concurrently, by default rows are read, converted and logged on this thread.
+    `time_columns`: the columns that are logged as timelines, `DEFAULT_TIME_COLUMNS` if not given.
+
+    Returns the plan that was used, or `None` if the episode is empty.
+    """
+
+    time_columns = DEFAULT_TIME_COLUMNS if time_columns is None else time_columns
+
+    # Ignore these columns (again, LeRobot-specific):
+    IGNORE = {"episode_data_index_from", "episode_data_index_to", "episode_id"}
+
+    with profile.span("select") if profile is not None else nullcontext():
+        hf_ds_subset = select_lerobot_episode(dataset.hf_dataset, dataset.episode_data_index, episode_index)
+        if encoded_images:
+            # LeRobot's torch transform can't handle encoded images, the rest of the values convert fine without it.
+            hf_ds_subset = disable_image_decoding(hf_ds_subset.with_format(None))
+        if preview is not None:
+            hf_ds_subset = select_preview_rows(hf_ds_subset, preview)
+    max_image_size = preview.max_image_size if preview is not None else None
+
+    video_cache = VideoFrameCache(max_bytes=video_cache_bytes)
+    videos_dir = dataset.videos_dir.parent
+    downscale_frame = partial(downscale_image, max_size=max_image_size) if max_image_size is not None else None
+
+    total_rows = len(hf_ds_subset)
+    pipeline = pipeline or PipelineOptions()
+    if pipeline.read_ahead > 0:
+        # Batches are sent from the reading thread, which may not see the thread-local recording:
+        recording = rr.get_data_recording(recording)
+    make_plan = partial(
+        ConversionPlan.from_row, time_like=set(time_columns), ignore=IGNORE, max_image_size=max_image_size
+    )
+    if batch_size > 0:
+        items = _send_batches(hf_ds_subset, batch_size, make_plan, plan, fixed_times or {}, recording, profile)
+    else:
+        with profile.span("read_timelines") if profile is not None else nullcontext():
+            timelines = read_timelines(hf_ds_subset, time_columns)
+        items = _iter_rows(hf_ds_subset, make_plan, plan, timelines, profile)
+
+    def to_archetype(column: ColumnPlan, cell: Any, frames: dict[str, Any]) -> Any:
+        if column.convert is not None:
+            return column.convert(cell)
+        if jpeg_quality is not None:
+            return rr.EncodedImage(contents=frames[column.column_name], media_type="image/jpeg")
+        return rr.Image(_bgr_to_rgb(frames[column.column_name]))
+
+    with ExitStack() as stack:
+        if pipeline.read_ahead > 0:
+            items = stack.enter_context(closing(read_ahead(items, pipeline.read_ahead)))
+        items_with_frames: Iterator[tuple[_RowItem, dict[str, Any]]]
+        if prefetch_rows > 0:
+            prefetcher = stack.enter_context(
+                FramePrefetcher(video_cache, videos_dir, lookahead=prefetch_rows, transform=downscale_frame)
+            )
+            items_with_frames = prefetcher.iter_rows(items, get_row=lambda item: item.row)
+        else:
+            items_with_frames = _decode_frames(items, video_cache, videos_dir, transform=downscale_frame)
+        if jpeg_quality is not None:
+            encoder = stack.enter_context(FrameEncoder(quality=jpeg_quality, lookahead=max(prefetch_rows, 1)))
+            items_with_frames = encoder.iter_rows(items_with_frames)
+
+        last_plan = _log_items(
+            items_with_frames, to_archetype, total_rows, pipeline, fixed_times or {}, recording, progress, profile
+        )
+
+    if profile is not None:
+        profile.add_video_cache(video_cache)
+    video_cache.close()
+    return last_plan or plan
+
+
+def log_dataset_to_rerun(
+    dataset: Any,
+    batch_size: int = 0,
+    encoded_images: bool = False,
+    preview: Preview | None = None,
+    fixed_times: dict[str, int | float] | None = None,
+    recording: rr.RecordingStream | None = None,
+    progress: Callable[[int, int | None], None] | None = None,
+    plan: ConversionPlan | None = None,
+    profile: Profile | None = None,
+    pipeline: PipelineOptions | None = None,
+    time_columns: Collection[str] | None = None,
+) -> ConversionPlan | None:
+    """
+    Log every row of a Hugging Face dataset to Rerun.
+
+    `batch_size`: if positive, the dataset is read in batches of this many rows (in Arrow format for
+    `datasets` datasets), and scalar and bar-chart columns are sent a batch at a time.
+    `encoded_images`: log image columns as the encoded files they are stored as, instead of decoding them.
+    `preview`: if given, only part of the dataset is logged, see `Preview`.
+    `fixed_times`: times on additional timelines that every row is logged at, e.g. `{"episode": 3}`.
+    `recording`: the recording to log to, defaults to the current active recording. Everything is flushed
+    to its sink before returning, closing it is up to the caller.
+    `progress`: called after every row with the number of rows logged so far and the total number of rows
+    (`None` for streaming datasets). It may raise to abort the conversion.
+    `plan`: how to log each column, made from the first row if not given.
+    `profile`: if given, the time spent in each stage of the conversion is added to it.
+    `pipeline`: which steps run concurrently, by default rows are read, converted and logged on this thread.
+    `time_columns`: the columns that are logged as timelines, `DEFAULT_TIME_COLUMNS` if not given.
+
+    Returns the plan that was used, or `None` if the dataset is empty.
+    """
+
+    time_columns = DEFAULT_TIME_COLUMNS if time_columns is None else time_columns
+
+    with profile.span("select") if profile is not None else nullcontext():
+        if encoded_images:
+            dataset = disable_image_decoding(dataset)
+        if preview is not None:
+            dataset = select_preview_rows(dataset, preview)
+    max_image_size = preview.max_image_size if preview is not None else None
+
+    total_rows = len(dataset) if isinstance(dataset, Sized) else None
+    pipeline = pipeline or PipelineOptions()
+    if pipeline.read_ahead > 0:
+        # Batches are sent from the reading thread, which may not see the thread-local recording:
+        recording = rr.get_data_recording(recording)
+    make_plan = partial(ConversionPlan.from_row, time_like=set(time_columns), max_image_size=max_image_size)
+    if batch_size > 0:
+        items = _send_batches(dataset, batch_size, make_plan, plan, fixed_times or {}, recording, profile)
+    else:
+        timelines = None
+        if isinstance(dataset, Dataset):  # streaming datasets can't be read up front
+            with profile.span("read_timelines") if profile is not None else nullcontext():
+                timelines = read_timelines(dataset, time_columns)
+        items = _iter_rows(dataset, make_plan, plan, timelines, profile)
+
+    def to_archetype(column: ColumnPlan, cell: Any, frames: dict[str, Any]) -> Any:
+        return column.convert(cell) if column.convert is not None else to_rerun(column.column_name, cell)
+
+    with ExitStack() as stack:
+        if pipeline.read_ahead > 0:
+            items = stack.enter_context(closing(read_ahead(items, pipeline.read_ahead)))
+        items_with_frames: Iterator[tuple[_RowItem, dict[str, Any]]] = ((item, {}) for item in items)
+        last_plan = _log_items(
+            items_with_frames, to_archetype, total_rows, pipeline, fixed_times or {}, recording, progress, profile
+        )
+
+    return last_plan or plan
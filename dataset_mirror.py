@@ -0,0 +1,197 @@
+"""
+A local mirror of datasets, shared between conversions, so that the files of a dataset are downloaded once.
+
+Files are fetched from a `MirrorBackend` (the Hugging Face Hub, or a local directory that stands in for it)
+in parallel, and kept per dataset and revision. Parquet shards are read from the mirror memory-mapped, as
+Arrow files. Once a dataset is mirrored it can be read without a connection.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path, PurePosixPath
+from typing import TYPE_CHECKING, Protocol
+
+from rrd_cache import KeyLocks
+
+if TYPE_CHECKING:
+    from datasets import Dataset
+
+logger = logging.getLogger(__name__)
+
+# How many files are downloaded at once:
+DEFAULT_FETCH_WORKERS = 8
+
+# The list of files of every mirrored revision, so that it can be read offline:
+FILES_MANIFEST = "files.json"
+
+
+class MirrorBackend(Protocol):
+    """Where a `DatasetMirror` gets datasets from."""
+
+    def revision(self, dataset_id: str) -> str | None:
+        """The current revision of the dataset, `None` if it can't be determined."""
+
+    def list_files(self, dataset_id: str, revision: str) -> list[str]:
+        """The paths of all files of the dataset at `revision`, relative to its root."""
+
+    def download(self, dataset_id: str, revision: str, filename: str, destination: Path) -> None:
+        """Write the file `filename` of the dataset at `revision` to `destination`."""
+
+
+class HubBackend:
+    """Datasets on the Hugging Face Hub."""
+
+    def revision(self, dataset_id: str) -> str | None:
+        from episode_index import dataset_revision
+
+        return dataset_revision(dataset_id)
+
+    def list_files(self, dataset_id: str, revision: str) -> list[str]:
+        from huggingface_hub import HfApi
+
+        return HfApi().list_repo_files(dataset_id, revision=revision, repo_type="dataset")
+
+    def download(self, dataset_id: str, revision: str, filename: str, destination: Path) -> None:
+        from huggingface_hub import hf_hub_download
+
+        # Downloaded next to `destination`, so that moving it into place doesn't copy it:
+        with tempfile.TemporaryDirectory(dir=destination.parent) as tmp_dir:
+            path = hf_hub_download(dataset_id, filename, repo_type="dataset", revision=revision, local_dir=tmp_dir)
+            os.replace(path, destination)
+
+
+class DirectoryBackend:
+    """
+    Datasets in a local directory, laid out as on the Hub: `<directory>/<dataset id>/<files>`.
+
+    There are no revisions, every dataset is at revision `local`.
+    """
+
+    def __init__(self, directory: Path) -> None:
+        self.directory = directory
+
+    def revision(self, dataset_id: str) -> str | None:
+        return "local" if (self.directory / dataset_id).is_dir() else None
+
+    def list_files(self, dataset_id: str, revision: str) -> list[str]:
+        root = self.directory / dataset_id
+        return sorted(path.relative_to(root).as_posix() for path in root.rglob("*") if path.is_file())
+
+    def download(self, dataset_id: str, revision: str, filename: str, destination: Path) -> None:
+        shutil.copyfile(self.directory / dataset_id / filename, destination)
+
+
+class DatasetMirror:
+    """
+    Keeps the files of datasets in `directory`, under `<dataset id>/<revision>/`.
+
+    Files are only fetched from `backend` when they aren't mirrored yet, and are written to a temporary
+    file and renamed into place, so that concurrent conversions (and processes) can share the mirror.
+    """
+
+    def __init__(
+        self, directory: Path, backend: MirrorBackend | None = None, max_workers: int = DEFAULT_FETCH_WORKERS
+    ) -> None:
+        self.directory = directory
+        self.backend = backend or HubBackend()
+        self.max_workers = max_workers
+        self.index_dir = directory / "episode_index"
+        self._file_locks = KeyLocks()  # held while a file is being downloaded
+
+    def dataset_dir(self, dataset_id: str, revision: str) -> Path:
+        return self.directory / dataset_id.replace("/", "__") / revision
+
+    def resolve_revision(self, dataset_id: str, revision: str | None = None) -> str | None:
+        """
+        `revision`, or else the current revision of the dataset according to the backend.
+
+        Without a backend to ask (e.g. offline), the most recently mirrored revision is used.
+        """
+        if revision is not None:
+            return revision
+        try:
+            revision = self.backend.revision(dataset_id)
+        except Exception as err:
+            logger.warning(f"Failed to look up the revision of {dataset_id}: {err}")
+        if revision is not None:
+            return revision
+
+        mirrored = [
+            path.parent for path in (self.directory / dataset_id.replace("/", "__")).glob(f"*/{FILES_MANIFEST}")
+        ]
+        if not mirrored:
+            return None
+        latest = max(mirrored, key=lambda path: path.stat().st_mtime)
+        logger.info(f"Using revision {latest.name} of {dataset_id} from the mirror")
+        return latest.name
+
+    def list_files(self, dataset_id: str, revision: str) -> list[str]:
+        """All files of the dataset, as listed by the backend the first time the revision is mirrored."""
+        manifest = self.dataset_dir(dataset_id, revision) / FILES_MANIFEST
+        if manifest.exists():
+            with open(manifest, encoding="utf-8") as f:
+                files: list[str] = json.load(f)
+            return files
+
+        files = self.backend.list_files(dataset_id, revision)
+        manifest.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = manifest.with_name(f"{manifest.name}.{uuid.uuid4().hex}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(files, f)
+        os.replace(tmp_path, manifest)
+        return files
+
+    def data_files(self, dataset_id: str, revision: str, split: str = "train") -> list[str]:
+        """
+        The Parquet shards of `split`, in order. Empty if the dataset isn't stored as Parquet.
+
+        If no file is named after `split`, all Parquet files are taken to be part of it.
+        """
+        parquet_files = sorted(name for name in self.list_files(dataset_id, revision) if name.endswith(".parquet"))
+        in_split = [
+            name
+            for name in parquet_files
+            if split in PurePosixPath(name).parent.parts or PurePosixPath(name).name.startswith(f"{split}-")
+        ]
+        return in_split or parquet_files
+
+    def fetch(self, dataset_id: str, revision: str, filenames: list[str]) -> list[Path]:
+        """The local paths of `filenames`, downloading the ones that aren't mirrored yet in parallel."""
+        dataset_dir = self.dataset_dir(dataset_id, revision)
+        paths = [dataset_dir / filename for filename in filenames]
+        missing = [(filename, path) for filename, path in zip(filenames, paths) if not path.exists()]
+        if missing:
+            logger.info(f"Fetching {len(missing)} files of {dataset_id}…")
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="mirror-fetch") as executor:
+                # `list` re-raises the first failed download:
+                list(executor.map(lambda item: self._fetch_file(dataset_id, revision, *item), missing))
+        return paths
+
+    def _fetch_file(self, dataset_id: str, revision: str, filename: str, path: Path) -> None:
+        with self._file_locks.hold(path):
+            if path.exists():
+                return  # fetched by another conversion in the meantime
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+            try:
+                self.backend.download(dataset_id, revision, filename, tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                tmp_path.unlink(missing_ok=True)
+
+    def open_shard(self, path: Path) -> Dataset:
+        """
+        A mirrored Parquet shard as a memory-mapped dataset.
+
+        The shard is converted to an Arrow file next to it on first use.
+        """
+        from datasets import Dataset
+
+        return Dataset.from_parquet(path.as_posix(), cache_dir=(path.parent / ".arrow").as_posix())
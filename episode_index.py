@@ -0,0 +1,240 @@
+"""
+An index from episode to the rows it occupies, so that an episode can be selected without scanning the dataset.
+
+Built once per dataset revision and stored on disk, and kept in memory for the datasets used last.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from datasets import Dataset, IterableDataset, concatenate_datasets, load_dataset
+from huggingface_hub import HfApi
+
+if TYPE_CHECKING:
+    from dataset_mirror import DatasetMirror
+
+logger = logging.getLogger(__name__)
+
+EPISODE_COLUMN = "episode_index"
+
+# Rows read at a time while building the index:
+INDEX_BATCH_SIZE = 10_000
+
+# How many indices are kept in memory, for the datasets used last:
+MAX_CACHED_INDICES = 16
+
+
+class EpisodeIndex:
+    """
+    Maps every episode to the `(shard, start, stop)` row ranges it occupies in a streaming dataset.
+
+    Shards are those of `dataset.shard(num_shards=dataset.n_shards, index=shard)`, and rows are
+    counted from the start of their shard.
+    """
+
+    def __init__(self, num_shards: int, segments: dict[int, list[tuple[int, int, int]]] | None) -> None:
+        self.num_shards = num_shards
+        self.segments = segments  # `None` if the dataset isn't split into episodes
+
+    @classmethod
+    def build(cls, dataset: IterableDataset) -> EpisodeIndex:
+        """Index `dataset` with a single pass over its episode column."""
+        if dataset.features is not None and EPISODE_COLUMN not in dataset.features:
+            return cls(dataset.n_shards, None)
+
+        segments: dict[int, list[tuple[int, int, int]]] = {}
+        episodes = dataset.select_columns([EPISODE_COLUMN])
+        for shard in range(dataset.n_shards):
+            row = 0
+            for batch in episodes.shard(num_shards=dataset.n_shards, index=shard).iter(batch_size=INDEX_BATCH_SIZE):
+                for episode in batch[EPISODE_COLUMN]:
+                    episode_segments = segments.setdefault(int(episode), [])
+                    if episode_segments and episode_segments[-1][0] == shard and episode_segments[-1][2] == row:
+                        episode_segments[-1] = (shard, episode_segments[-1][1], row + 1)
+                    else:
+                        episode_segments.append((shard, row, row + 1))
+                    row += 1
+        return cls(dataset.n_shards, segments)
+
+    def select(self, dataset: IterableDataset, episode_index: int) -> IterableDataset:
+        """The rows of `episode_index`, read only from the shards that contain it."""
+        if self.segments is None:
+            return dataset
+
+        parts = [
+            dataset.shard(num_shards=self.num_shards, index=shard).skip(start).take(stop - start)
+            for shard, start, stop in self._segments_of(episode_index)
+        ]
+        return parts[0] if len(parts) == 1 else concatenate_datasets(parts)
+
+    def shards_of(self, episode_index: int) -> list[int]:
+        """The shards that contain `episode_index`."""
+        if self.segments is None:
+            return list(range(self.num_shards))
+        return sorted({shard for shard, _, _ in self._segments_of(episode_index)})
+
+    def select_from_shards(self, shards: dict[int, Dataset], episode_index: int) -> Dataset:
+        """The rows of `episode_index`, given the shards that contain it (see `shards_of`) as map-style datasets."""
+        if self.segments is None:
+            parts = [shards[shard] for shard in range(self.num_shards)]
+        else:
+            parts = [
+                shards[shard].select(range(start, stop)) for shard, start, stop in self._segments_of(episode_index)
+            ]
+        return parts[0] if len(parts) == 1 else concatenate_datasets(parts)
+
+    def _segments_of(self, episode_index: int) -> list[tuple[int, int, int]]:
+        assert self.segments is not None
+        if episode_index not in self.segments:
+            raise KeyError(f"Episode {episode_index} not found, the dataset has {len(self.segments)} episodes")
+        return self.segments[episode_index]
+
+    def to_json(self) -> dict[str, Any]:
+        return {
+            "num_shards": self.num_shards,
+            "segments": None
+            if self.segments is None
+            else {str(episode): segments for episode, segments in self.segments.items()},
+        }
+
+    @classmethod
+    def from_json(cls, data: dict[str, Any]) -> EpisodeIndex:
+        segments = data["segments"]
+        if segments is not None:
+            segments = {
+                int(episode): [tuple(segment) for segment in episode_segments]
+                for episode, episode_segments in segments.items()
+            }
+        return cls(data["num_shards"], segments)
+
+
+def dataset_revision(dataset_id: str) -> str | None:
+    """The current commit of the dataset on the Hub, or `None` if it can't be determined."""
+    try:
+        return HfApi().dataset_info(dataset_id).sha
+    except Exception as err:
+        logger.warning(f"Failed to look up the revision of {dataset_id}: {err}")
+        return None
+
+
+def _index_path(cache_dir: Path, dataset_id: str, revision: str) -> Path:
+    return cache_dir / f"{dataset_id.replace('/', '_')}_{revision}.json"
+
+
+_cached_indices: OrderedDict[tuple[str, str | None], EpisodeIndex] = OrderedDict()
+_cached_indices_lock = threading.Lock()
+
+
+def load_episode_index(
+    dataset: IterableDataset, dataset_id: str, revision: str | None, cache_dir: Path | None = None
+) -> EpisodeIndex:
+    """
+    Loads the episode index of `dataset` from `cache_dir`, building and storing it on first use.
+
+    Indices are only stored when the revision is known, since they are invalidated by any change to the dataset.
+    They are also kept in memory (see `MAX_CACHED_INDICES`), by revision if it is known, so that the index of a
+    dataset whose revision can't be looked up (e.g. offline) isn't built again for every episode.
+    """
+    key = (dataset_id, revision)
+    with _cached_indices_lock:
+        index = _cached_indices.get(key)
+        if index is not None:
+            _cached_indices.move_to_end(key)
+            return index
+
+    if cache_dir is not None and revision is not None:
+        index = read_episode_index(dataset_id, revision, cache_dir)
+    if index is None:
+        logger.info(f"Building the episode index of {dataset_id}…")
+        index = EpisodeIndex.build(dataset)
+        if cache_dir is not None and revision is not None:
+            store_episode_index(index, dataset_id, revision, cache_dir)
+
+    with _cached_indices_lock:
+        _cached_indices[key] = index
+        while len(_cached_indices) > MAX_CACHED_INDICES:
+            _cached_indices.popitem(last=False)
+    return index
+
+
+def read_episode_index(dataset_id: str, revision: str, cache_dir: Path) -> EpisodeIndex | None:
+    """The episode index stored in `cache_dir`, `None` if there is none."""
+    path = _index_path(cache_dir, dataset_id, revision)
+    if not path.exists():
+        return None
+    with open(path, encoding="utf-8") as f:
+        return EpisodeIndex.from_json(json.load(f))
+
+
+def store_episode_index(index: EpisodeIndex, dataset_id: str, revision: str, cache_dir: Path) -> None:
+    path = _index_path(cache_dir, dataset_id, revision)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_json(), f)
+    tmp_path.replace(path)
+
+
+def load_episode(
+    dataset_id: str,
+    episode_index: int,
+    revision: str | None = None,
+    cache_dir: Path | None = None,
+    mirror: DatasetMirror | None = None,
+) -> IterableDataset | Dataset:
+    """
+    Streams the rows of a single episode of a Hugging Face dataset.
+
+    `mirror`: if given, the shards that hold the episode are fetched to the mirror instead, and read from
+    there as a (memory-mapped) `Dataset`. Datasets that aren't stored as Parquet are still streamed.
+    """
+    if mirror is not None:
+        episode = load_mirrored_episode(mirror, dataset_id, episode_index, revision)
+        if episode is not None:
+            return episode
+
+    dataset = load_dataset(dataset_id, split="train", streaming=True, revision=revision)
+    index = load_episode_index(dataset, dataset_id, revision, cache_dir)
+    return index.select(dataset, episode_index)
+
+
+def load_mirrored_episode(
+    mirror: DatasetMirror, dataset_id: str, episode_index: int, revision: str | None = None
+) -> Dataset | None:
+    """
+    The rows of a single episode, read from the shards of `mirror` that hold it.
+
+    Returns `None` if the dataset can't be mirrored, because it isn't stored as Parquet (or can't be found).
+    """
+    revision = mirror.resolve_revision(dataset_id, revision)
+    if revision is None:
+        return None
+    data_files = mirror.data_files(dataset_id, revision)
+    if not data_files:
+        return None
+
+    # Shards are the data files, so the index of a mirrored dataset is built from its local copy:
+    index = read_episode_index(dataset_id, revision, mirror.index_dir)
+    if index is None or index.num_shards != len(data_files):
+        paths = mirror.fetch(dataset_id, revision, data_files)
+        local = load_dataset("parquet", data_files=[path.as_posix() for path in paths], split="train", streaming=True)
+        logger.info(f"Building the episode index of {dataset_id}…")
+        index = EpisodeIndex.build(local)
+        store_episode_index(index, dataset_id, revision, mirror.index_dir)
+
+    shards = index.shards_of(episode_index)
+    paths = mirror.fetch(dataset_id, revision, [data_files[shard] for shard in shards])
+    return index.select_from_shards(dict(zip(shards, map(mirror.open_shard, paths))), episode_index)
+
+
+def select_lerobot_episode(hf_dataset: Dataset, episode_data_index: dict[str, Any], episode_index: int) -> Dataset:
+    """The rows of an episode of a LeRobot dataset, using the episode boundaries LeRobot ships with it."""
+    start = int(episode_data_index["from"][episode_index])
+    stop = int(episode_data_index["to"][episode_index])
+    return hf_dataset.select(range(start, stop))
@@ -0,0 +1,106 @@
+"""Runs dataset conversions in the background, with deduplication, progress and cancellation."""
+
+from __future__ import annotations
+
+import logging
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class JobCancelledError(Exception):
+    """Raised inside a job once nobody is waiting for its result anymore."""
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue is full."""
+
+
+class Job:
+    """A conversion running (or queued) on a `JobScheduler`, shared by every request for the same key."""
+
+    def __init__(self, key: str) -> None:
+        self.key = key
+        self.future: Future[Any] = Future()
+        self.rows_done = 0
+        self.total_rows: int | None = None
+        self.waiters = 0
+        self._cancelled = threading.Event()
+
+    def report_progress(self, rows_done: int, total_rows: int | None) -> None:
+        """Progress callback for the conversion, raises `JobCancelledError` once the job is cancelled."""
+        if self._cancelled.is_set():
+            raise JobCancelledError(self.key)
+        self.rows_done = rows_done
+        self.total_rows = total_rows
+
+    @property
+    def queued(self) -> bool:
+        """Whether the job is still waiting for a free worker."""
+        return not self.future.running() and not self.future.done()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled.is_set()
+
+    def cancel(self) -> None:
+        self._cancelled.set()
+        self.future.cancel()  # only succeeds while still queued
+
+
+class JobScheduler:
+    """
+    Runs jobs on a bounded pool of worker threads.
+
+    `max_workers`: the number of jobs that run concurrently, the rest wait in a queue.
+    `max_queued`: the number of jobs that may wait, beyond that `submit` raises `QueueFullError`.
+
+    Jobs with the same key are deduplicated: a submit while a job with that key is queued or running
+    joins the existing job instead. Every `submit` must be paired with a `release`, the job is
+    cancelled once it has been released by everyone that submitted it.
+    """
+
+    def __init__(self, max_workers: int = 2, max_queued: int = 16) -> None:
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="job")
+        self._jobs: dict[str, Job] = {}
+        self._lock = threading.RLock()  # re-entrant, done callbacks may run inside `submit` and `release`
+
+    def submit(self, key: str, fn: Callable[[Job], Any]) -> Job:
+        with self._lock:
+            job = self._jobs.get(key)
+            if job is None or job.cancelled:
+                if len(self._jobs) >= self.max_workers + self.max_queued:
+                    raise QueueFullError(f"Too many conversions in progress ({len(self._jobs)})")
+                job = Job(key)
+                job.future = self._executor.submit(fn, job)
+                self._jobs[key] = job
+                job.future.add_done_callback(lambda _, job=job: self._remove(job))  # type: ignore[misc]
+            job.waiters += 1
+            return job
+
+    def get(self, key: str) -> Job | None:
+        """The queued or running job for `key`, if any."""
+        with self._lock:
+            job = self._jobs.get(key)
+            return None if job is None or job.cancelled else job
+
+    def release(self, job: Job) -> None:
+        """Stop waiting for `job`, cancelling it if nobody else is waiting for it."""
+        with self._lock:
+            job.waiters -= 1
+            if job.waiters <= 0 and not job.future.done():
+                logger.info(f"Cancelling job {job.key}")
+                job.cancel()
+
+    def _remove(self, job: Job) -> None:
+        with self._lock:
+            if self._jobs.get(job.key) is job:
+                del self._jobs[job.key]
+
+    def num_jobs(self) -> int:
+        with self._lock:
+            return len(self._jobs)
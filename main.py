@@ -3,15 +3,116 @@
 from __future__ import annotations
 
 import argparse
+import json
 import logging
+from contextlib import nullcontext
+from pathlib import Path
 
 import rerun as rr
-from datasets import load_dataset
 
-from dataset_conversion import log_dataset_to_rerun
+from batching import BATCHER_PRESETS, BatcherOptions, new_recording
+from dataset_conversion import DEFAULT_TIME_COLUMNS, Preview, log_dataset_to_rerun
+from dataset_mirror import DatasetMirror, DirectoryBackend
+from episode_index import dataset_revision, load_episode
+from pipeline import PipelineOptions
+from profiling import Profile
 
 logger = logging.getLogger(__name__)
 
+# Episode indices are built on the first run for each dataset revision, and reused after that:
+EPISODE_INDEX_DIR = Path.home() / ".cache" / "rerun_example_huggingface" / "episode_index"
+
+
+def parse_time(value: str) -> int | float:
+    """A row number (`12`) or seconds (`1.5`), see `Preview`."""
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def add_preview_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--stride", type=int, default=1, help="Only log every n-th row")
+    parser.add_argument("--max-hz", type=float, help="Only log this many rows per second")
+    parser.add_argument(
+        "--start", type=parse_time, help="First row to log: a row number (e.g. 100) or seconds (e.g. 2.5)"
+    )
+    parser.add_argument("--end", type=parse_time, help="Stop logging at this row number or time in seconds")
+    parser.add_argument("--max-image-size", type=int, help="Downscale images larger than this many pixels")
+
+
+def preview_from_args(args: argparse.Namespace) -> Preview | None:
+    """The preview asked for by the `add_preview_arguments` options, if any."""
+    if args.stride == 1 and all(option is None for option in (args.max_hz, args.start, args.end, args.max_image_size)):
+        return None
+    return Preview(
+        stride=args.stride,
+        max_hz=args.max_hz,
+        start=args.start,
+        end=args.end,
+        max_image_size=args.max_image_size,
+    )
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--read-ahead", type=int, default=0, help="Read rows on a background thread, up to this many rows ahead"
+    )
+    parser.add_argument(
+        "--convert-workers", type=int, default=0, help="Convert rows to Rerun archetypes on this many threads"
+    )
+    parser.add_argument("--convert-ahead", type=int, default=16, help="How many rows may be converted ahead of logging")
+
+
+def pipeline_from_args(args: argparse.Namespace) -> PipelineOptions:
+    """The pipeline asked for by the `add_pipeline_arguments` options."""
+    return PipelineOptions(
+        read_ahead=args.read_ahead, convert_workers=args.convert_workers, convert_ahead=args.convert_ahead
+    )
+
+
+def add_mirror_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--mirror",
+        type=Path,
+        help="Keep the files of datasets in this directory, and read them from there when possible",
+    )
+    parser.add_argument(
+        "--dataset-source",
+        type=Path,
+        help="With --mirror: read datasets from this directory (laid out as `<org>/<name>/…`) instead of the Hub",
+    )
+
+
+def mirror_from_args(args: argparse.Namespace) -> DatasetMirror | None:
+    """The mirror asked for by the `add_mirror_arguments` options, if any."""
+    if args.mirror is None:
+        return None
+    backend = DirectoryBackend(args.dataset_source) if args.dataset_source is not None else None
+    return DatasetMirror(args.mirror, backend)
+
+
+def add_batcher_arguments(parser: argparse.ArgumentParser, default: str) -> None:
+    parser.add_argument(
+        "--batcher",
+        choices=sorted(BATCHER_PRESETS),
+        default=default,
+        help="How logged data is batched into chunks: `file` for throughput, `viewer` for latency",
+    )
+    parser.add_argument("--flush-tick-secs", type=float, help="Send logged data at least this often (in seconds)")
+    parser.add_argument("--flush-num-bytes", type=int, help="Send logged data once this many bytes are pending")
+    parser.add_argument("--flush-num-rows", type=int, help="Send logged data once this many rows are pending")
+
+
+def batcher_from_args(args: argparse.Namespace) -> BatcherOptions:
+    """The batching asked for by the `add_batcher_arguments` options: a preset, with any thresholds overridden."""
+    preset = BATCHER_PRESETS[args.batcher]
+    return BatcherOptions(
+        flush_tick_seconds=args.flush_tick_secs if args.flush_tick_secs is not None else preset.flush_tick_seconds,
+        flush_num_bytes=args.flush_num_bytes if args.flush_num_bytes is not None else preset.flush_num_bytes,
+        flush_num_rows=args.flush_num_rows if args.flush_num_rows is not None else preset.flush_num_rows,
+    )
+
 
 def main() -> None:
     # Ensure the logging gets written to stderr:
@@ -20,22 +121,72 @@ def main() -> None:
 
     parser = argparse.ArgumentParser(description="Log a HuggingFace dataset to Rerun.")
     parser.add_argument("--dataset", default="lerobot/pusht", help="The name of the dataset to load")
-    parser.add_argument("--episode-index", default=1, help="Which episode to select")
+    parser.add_argument("--episode-index", type=int, default=1, help="Which episode to select")
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=0,
+        help="Send scalar and bar-chart columns in batches of this many rows (0 logs row by row)",
+    )
+    parser.add_argument(
+        "--encoded-images",
+        action="store_true",
+        help="Log images as the encoded (e.g. PNG or JPEG) files they are stored as, instead of raw pixels",
+    )
+    parser.add_argument(
+        "--time-columns",
+        nargs="+",
+        default=sorted(DEFAULT_TIME_COLUMNS),
+        help="The columns to log as timelines, if the dataset has them",
+    )
+    add_preview_arguments(parser)
+    add_pipeline_arguments(parser)
+    add_mirror_arguments(parser)
+    add_batcher_arguments(parser, default="viewer")
+    parser.add_argument("--profile", type=Path, help="Write the time spent in each stage to this JSON file")
+    parser.add_argument(
+        "--profile-timeline",
+        action="store_true",
+        help="Also log the time spent in each stage to the recording, on a separate `profile_time` timeline",
+    )
     args = parser.parse_args()
+    preview = preview_from_args(args)
+    profile = Profile(keep_events=args.profile_timeline) if args.profile or args.profile_timeline else None
 
     print("Loading dataset…")
-    dataset = load_dataset(args.dataset, split="train", streaming=True)
-
-    # This is for LeRobot datasets (https://huggingface.co/lerobot):
-    ds_subset = dataset.filter(
-        lambda frame: "episode_index" not in frame or frame["episode_index"] == args.episode_index
-    )
+    # Episodes are for LeRobot datasets (https://huggingface.co/lerobot):
+    mirror = mirror_from_args(args)
+    with profile.span("load") if profile is not None else nullcontext():
+        revision = mirror.resolve_revision(args.dataset) if mirror is not None else dataset_revision(args.dataset)
+        ds_subset = load_episode(
+            args.dataset, args.episode_index, revision=revision, cache_dir=EPISODE_INDEX_DIR, mirror=mirror
+        )
 
     print("Starting Rerun…")
-    rr.init(f"rerun_example_huggingface {args.dataset}", spawn=True)
+    new_recording(f"rerun_example_huggingface {args.dataset}", batcher_from_args(args), make_default=True, spawn=True)
 
     print("Logging to Rerun…")
-    log_dataset_to_rerun(ds_subset)
+    plan = log_dataset_to_rerun(
+        ds_subset,
+        batch_size=args.batch_size,
+        encoded_images=args.encoded_images,
+        preview=preview,
+        profile=profile,
+        pipeline=pipeline_from_args(args),
+        time_columns=args.time_columns,
+    )
+    if plan is not None:
+        logger.info(f"Logged columns as:\n{plan.describe()}")
+
+    if profile is not None:
+        logger.info(f"Time spent per stage:\n{profile.describe()}")
+        if args.profile_timeline:
+            profile.log_to_rerun()
+        if args.profile is not None:
+            with open(args.profile, "w", encoding="utf-8") as f:
+                json.dump(profile.report(), f, indent=2)
+
+    rr.disconnect()  # flush what is left to the viewer, and close the connection
 
 
 if __name__ == "__main__":
@@ -0,0 +1,101 @@
+"""Bounded, order-preserving stages to run the steps of a conversion concurrently."""
+
+from __future__ import annotations
+
+import threading
+from collections import deque
+from concurrent.futures import Executor, Future
+from dataclasses import dataclass
+from queue import Empty, Full, Queue
+from typing import Any, Callable, Generator, Iterable, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+# How often (in seconds) a blocked reader checks whether the consumer went away:
+POLL_INTERVAL = 0.1
+
+
+@dataclass(frozen=True)
+class PipelineOptions:
+    """
+    How the steps of a conversion overlap.
+
+    Rows are read from the dataset, their video frames decoded (see `prefetch_rows`), converted to
+    Rerun archetypes and finally logged in order. Every stage is at most a bounded number of rows ahead
+    of the next, so memory use doesn't grow with the length of an episode.
+
+    `read_ahead`: if positive, rows are read on a background thread, up to this many rows ahead.
+    `convert_workers`: if positive, rows are converted on this many threads instead of the logging thread.
+    `convert_ahead`: how many rows may be converted ahead of logging, with `convert_workers`.
+    """
+
+    read_ahead: int = 0
+    convert_workers: int = 0
+    convert_ahead: int = 16
+
+
+_DONE = object()
+
+
+def read_ahead(items: Iterable[T], depth: int, name: str = "read-ahead") -> Generator[T, None, None]:
+    """
+    Iterates over `items` on a background thread, at most `depth` items ahead of the consumer.
+
+    Exceptions raised while iterating are re-raised to the consumer. Closing the returned iterator stops
+    the background thread.
+    """
+    queue: Queue[tuple[Any, BaseException | None]] = Queue(maxsize=depth)
+    stop = threading.Event()
+
+    def put(value: Any, error: BaseException | None = None) -> bool:
+        while not stop.is_set():
+            try:
+                queue.put((value, error), timeout=POLL_INTERVAL)
+                return True
+            except Full:
+                pass
+        return False
+
+    def produce() -> None:
+        try:
+            for item in items:
+                if not put(item):
+                    return
+            put(_DONE)
+        except BaseException as err:
+            put(_DONE, err)
+
+    thread = threading.Thread(target=produce, name=name, daemon=True)
+    thread.start()
+    try:
+        while True:
+            try:
+                item, error = queue.get(timeout=POLL_INTERVAL)
+            except Empty:
+                if not thread.is_alive() and queue.empty():
+                    raise RuntimeError(f"The {name} thread stopped unexpectedly") from None
+                continue
+            if item is _DONE:
+                if error is not None:
+                    raise error
+                return
+            yield item
+    finally:
+        stop.set()
+        thread.join()
+
+
+def map_ordered(fn: Callable[[T], R], items: Iterable[T], executor: Executor, depth: int) -> Generator[R, None, None]:
+    """Applies `fn` to `items` on `executor`, at most `depth` items ahead of the consumer, yielding results in order."""
+    pending: deque[Future[R]] = deque()
+    try:
+        for item in items:
+            pending.append(executor.submit(fn, item))
+            if len(pending) > depth:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        for future in pending:
+            future.cancel()
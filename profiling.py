@@ -0,0 +1,215 @@
+"""Timing and memory instrumentation of conversions: time per named stage, counters and peak memory."""
+
+from __future__ import annotations
+
+import sys
+import threading
+import time
+from array import array
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Any, Iterable, Iterator, TypeVar
+
+import numpy as np
+import rerun as rr
+
+if TYPE_CHECKING:
+    from video_decoder import VideoFrameCache
+
+T = TypeVar("T")
+
+# The timeline that `Profile.log_to_rerun` logs stage timings on, in seconds since the profile started:
+PROFILE_TIMELINE = "profile_time"
+
+
+def _proc_status_bytes(field: str) -> int | None:
+    try:
+        with open("/proc/self/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith(f"{field}:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def rss_bytes() -> int | None:
+    """The current resident memory of this process, `None` where it isn't known (outside of Linux)."""
+    return _proc_status_bytes("VmRSS")
+
+
+def peak_rss_bytes() -> int:
+    """The peak resident memory of this process so far."""
+    # On Linux `ru_maxrss` carries over from the parent process through `exec`, `VmHWM` doesn't.
+    peak = _proc_status_bytes("VmHWM")
+    if peak is not None:
+        return peak
+    import resource
+
+    # `ru_maxrss` is in kilobytes on Linux, but in bytes on macOS.
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def archetype_bytes(archetype: Any) -> int:
+    """The size of the data of a Rerun archetype, before it is compressed or written."""
+    num_bytes = 0
+    for field in getattr(type(archetype), "__attrs_attrs__", ()):
+        batch = getattr(archetype, field.name)
+        if batch is not None:
+            num_bytes += batch.as_arrow_array().nbytes
+    return num_bytes
+
+
+@dataclass
+class StageStats:
+    count: int = 0
+    seconds: float = 0.0
+    max_seconds: float = 0.0
+
+
+class Profile:
+    """
+    Collects where the time of a conversion goes.
+
+    That is how long each named stage takes, counters (like the number of decoded frames and of logged
+    bytes) and peak memory.
+
+    Stages are timed with `span`, `timed` (for the time spent waiting on an iterator) or `add`, and
+    summed per name. Stages can overlap: e.g. `decode_video` runs on decoding threads while rows are logged.
+    The profile is thread-safe, and profiles can be summed with `merge`.
+
+    `keep_events`: also keep the time of every step, to log them to a Rerun timeline with `log_to_rerun`.
+    """
+
+    def __init__(self, keep_events: bool = False) -> None:
+        self.keep_events = keep_events
+        self.stages: dict[str, StageStats] = {}
+        self.counters: dict[str, int] = {}
+        self.start_time = time.perf_counter()
+        self._events: dict[str, tuple[array[float], array[float]]] = {}  # stage to (start times, durations)
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float) -> None:
+        """Add a step of `seconds` that just ended to stage `name`."""
+        with self._lock:
+            stats = self.stages.get(name)
+            if stats is None:
+                stats = self.stages[name] = StageStats()
+            stats.count += 1
+            stats.seconds += seconds
+            stats.max_seconds = max(stats.max_seconds, seconds)
+            if self.keep_events:
+                starts, durations = self._events.setdefault(name, (array("d"), array("d")))
+                starts.append(time.perf_counter() - seconds - self.start_time)
+                durations.append(seconds)
+
+    @contextmanager
+    def span(self, name: str) -> Iterator[None]:
+        """Times the body of the `with` statement as a step of stage `name`."""
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start_time)
+
+    def timed(self, name: str, iterable: Iterable[T]) -> Iterator[T]:
+        """Yields the items of `iterable`, timing the wait for every item as a step of stage `name`."""
+        iterator = iter(iterable)
+        while True:
+            start_time = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                self.add(name, time.perf_counter() - start_time)
+            yield item
+
+    def count(self, name: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_video_cache(self, video_cache: VideoFrameCache) -> None:
+        """Add the decoding done by `video_cache`, and its hits and misses."""
+        with self._lock:
+            if video_cache.misses:
+                stats = self.stages.setdefault("decode_video", StageStats())
+                stats.count += video_cache.misses
+                stats.seconds += video_cache.decode_seconds
+                stats.max_seconds = max(stats.max_seconds, video_cache.max_decode_seconds)
+        self.count("frames_decoded", video_cache.misses)
+        self.count("video_cache_hits", video_cache.hits)
+        self.count("video_cache_misses", video_cache.misses)
+
+    def merge(self, other: Profile) -> None:
+        """Add the stages and counters of `other` to this profile."""
+        with other._lock:
+            stages = {name: StageStats(**vars(stats)) for name, stats in other.stages.items()}
+            counters = dict(other.counters)
+        with self._lock:
+            for name, other_stats in stages.items():
+                stats = self.stages.setdefault(name, StageStats())
+                stats.count += other_stats.count
+                stats.seconds += other_stats.seconds
+                stats.max_seconds = max(stats.max_seconds, other_stats.max_seconds)
+            for name, amount in counters.items():
+                self.counters[name] = self.counters.get(name, 0) + amount
+
+    def report(self) -> dict[str, Any]:
+        """The profile as JSON-serializable data."""
+        with self._lock:
+            stages = {
+                name: {
+                    "count": stats.count,
+                    "seconds": stats.seconds,
+                    "mean_seconds": stats.seconds / stats.count if stats.count else 0.0,
+                    "max_seconds": stats.max_seconds,
+                }
+                for name, stats in sorted(self.stages.items(), key=lambda item: item[1].seconds, reverse=True)
+            }
+            counters = dict(self.counters)
+
+        lookups = counters.get("video_cache_hits", 0) + counters.get("video_cache_misses", 0)
+        return {
+            "seconds": time.perf_counter() - self.start_time,
+            "stages": stages,
+            "counters": counters,
+            "video_cache_hit_rate": counters.get("video_cache_hits", 0) / lookups if lookups else None,
+            "rss_bytes": rss_bytes(),
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+
+    def describe(self) -> str:
+        """A human-readable summary of the profile."""
+        report = self.report()
+        lines = [f"{report['seconds']:.2f}s in total, peak memory {report['peak_rss_bytes'] / 1e6:.0f} MB"]
+        for name, stats in report["stages"].items():
+            lines.append(
+                f"  {name:<16} {stats['seconds']:>8.2f}s {stats['count']:>9} × {stats['mean_seconds'] * 1e3:.3f} ms"
+            )
+        lines += [f"  {name:<16} {amount:>9}" for name, amount in report["counters"].items()]
+        if report["video_cache_hit_rate"] is not None:
+            lines.append(f"  video cache hit rate {report['video_cache_hit_rate']:.0%}")
+        return "\n".join(lines)
+
+    def log_to_rerun(self, entity_path: str = "profile", recording: rr.RecordingStream | None = None) -> None:
+        """
+        Log the duration of every step (in milliseconds) on the `profile_time` timeline, and the summary.
+
+        Only steps that were kept (see `keep_events`) are logged, one entity per stage under `entity_path`.
+        """
+        with self._lock:
+            events = {
+                name: (np.array(starts), np.array(durations)) for name, (starts, durations) in self._events.items()
+            }
+
+        for name, (starts, durations) in events.items():
+            # rerun-sdk 0.18 `send_columns` passes `recording` straight to the bindings, so it must be unwrapped:
+            rr.send_columns(
+                f"{entity_path}/{name}",
+                times=[rr.TimeSecondsColumn(PROFILE_TIMELINE, starts)],
+                components=[rr.components.ScalarBatch(durations * 1e3)],
+                recording=rr.RecordingStream.to_native(recording),  # type: ignore[arg-type]
+            )
+        rr.log(f"{entity_path}/summary", rr.TextDocument(self.describe()), static=True, recording=recording)
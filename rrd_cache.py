@@ -0,0 +1,216 @@
+"""An on-disk cache of converted `.rrd` recordings, safe to share between concurrent requests."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from collections.abc import Hashable, Iterator
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_BYTES = 10 * 1024**3
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+
+
+class KeyLocks:
+    """
+    A lock per key, for work that must happen once per key (e.g. creating a file) while other keys proceed.
+
+    A key's lock only exists while a thread holds or waits for it, so that there isn't one per key ever used.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        # The lock of every key in use, with the number of threads holding or waiting for it:
+        self._locks: dict[Hashable, tuple[threading.Lock, int]] = {}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._locks)
+
+    @contextmanager
+    def hold(self, key: Hashable) -> Iterator[None]:
+        """Holds the lock of `key`, waiting for any other thread holding it."""
+        with self._lock:
+            key_lock, users = self._locks.get(key, (threading.Lock(), 0))
+            self._locks[key] = (key_lock, users + 1)
+
+        try:
+            with key_lock:
+                yield
+        finally:
+            with self._lock:
+                key_lock, users = self._locks[key]
+                if users == 1:
+                    del self._locks[key]
+                else:
+                    self._locks[key] = (key_lock, users - 1)
+
+
+class RrdCache:
+    """
+    Caches recordings in `directory`, one `.rrd` file per key.
+
+    Recordings are written to a temporary file and renamed into place once complete, so a
+    partially written (or crashed) conversion is never served. Concurrent requests for the same
+    key wait for a single conversion. Recordings older than `max_age_seconds` are removed, and
+    the least recently used ones are removed while the cache is larger than `max_bytes`.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+    ) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._key_locks = KeyLocks()  # held while a key is being created
+        self._in_progress: dict[str, Path] = {}
+        self._digests: dict[str, tuple[int, int, str]] = {}  # key to (inode, size, digest) of its recording
+
+    @staticmethod
+    def key(dataset_id: str, revision: str | None, episode_index: int, converter_version: int, **options: Any) -> str:
+        """A file-system safe cache key for a converted episode."""
+        fields = {
+            "dataset_id": dataset_id,
+            "revision": revision,
+            "episode_index": episode_index,
+            "converter_version": converter_version,
+            **options,
+        }
+        digest = hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        return f"{dataset_id.replace('/', '_')}_{episode_index}_{digest}"
+
+    def path(self, key: str) -> Path:
+        return self.directory / f"{key}.rrd"
+
+    def get(self, key: str) -> Path | None:
+        """Returns the path of the cached recording for `key`, or `None` if it isn't cached."""
+        path = self.path(key)
+        try:
+            os.utime(path)  # mark as recently used
+        except FileNotFoundError:
+            return None
+        with self._lock:
+            self.hits += 1
+        return path
+
+    def digest(self, key: str) -> str | None:
+        """
+        A hash of the contents of the recording for `key`, or `None` if it isn't cached.
+
+        It is computed once per recording, and kept until the recording is replaced or evicted.
+        """
+        try:
+            f = open(self.path(key), "rb")
+        except FileNotFoundError:
+            return None
+        with f:
+            # Not the modification time: `get` updates it to track use.
+            stat = os.fstat(f.fileno())
+            with self._lock:
+                known = self._digests.get(key)
+            if known is not None and known[:2] == (stat.st_ino, stat.st_size):
+                return known[2]
+
+            hasher = hashlib.sha256()
+            while chunk := f.read(1024 * 1024):
+                hasher.update(chunk)
+        digest = hasher.hexdigest()[:32]
+        with self._lock:
+            self._digests[key] = (stat.st_ino, stat.st_size, digest)
+        return digest
+
+    def in_progress_path(self, key: str) -> Path | None:
+        """The temporary file a recording for `key` is currently being written to, if any."""
+        with self._lock:
+            return self._in_progress.get(key)
+
+    def get_or_create(self, key: str, create: Callable[[Path], None]) -> Path:
+        """
+        Returns the path of the cached recording for `key`.
+
+        On a miss, `create` is called with a temporary path it must write the complete recording to.
+        """
+        path = self.path(key)
+
+        with self._key_locks.hold(key):
+            cached = self.get(key)
+            if cached is not None:
+                return cached
+
+            with self._lock:
+                self.misses += 1
+
+            self.directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_name(f"{path.stem}.{uuid.uuid4().hex}.tmp")
+            with self._lock:
+                self._in_progress[key] = tmp_path
+            try:
+                create(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                with self._lock:
+                    del self._in_progress[key]
+                tmp_path.unlink(missing_ok=True)
+
+        self.evict(keep=path)
+        return path
+
+    def evict(self, keep: Path | None = None) -> None:
+        """Remove expired recordings, then least recently used ones until the cache fits in `max_bytes`."""
+        with self._lock:
+            now = time.time()
+            # Left behind by conversions that crashed:
+            for path in self.directory.glob("*.tmp"):
+                try:
+                    if now - path.stat().st_mtime > self.max_age_seconds:
+                        path.unlink()
+                except FileNotFoundError:
+                    pass
+
+            entries = []
+            for path in self.directory.glob("*.rrd"):
+                try:
+                    stat = path.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            entries.sort()  # least recently used first
+            total_bytes = sum(size for _, size, _ in entries)
+            for mtime, size, path in entries:
+                if path == keep:
+                    continue
+                if now - mtime <= self.max_age_seconds and total_bytes <= self.max_bytes:
+                    continue
+                path.unlink(missing_ok=True)
+                self._digests.pop(path.stem, None)
+                total_bytes -= size
+                self.evictions += 1
+                logger.info(f"Evicted {path} from the recording cache")
+
+    def stats(self) -> dict[str, int]:
+        with self._lock:
+            entries = list(self.directory.glob("*.rrd"))
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(entries),
+                "bytes": sum(path.stat().st_size for path in entries if path.exists()),
+            }
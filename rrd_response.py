@@ -0,0 +1,155 @@
+"""
+HTTP responses for cached `.rrd` recordings, cheap to serve again.
+
+Cached recordings never change (their key covers everything that goes into them), so they are served with
+a content-hash `ETag` and a long-lived `Cache-Control`: browsers keep them, and revalidate with a
+`304 Not Modified` at most. Single byte ranges are supported, and recordings can optionally be gzipped
+on the fly for clients that accept it.
+"""
+
+from __future__ import annotations
+
+import os
+import re
+import zlib
+from typing import BinaryIO, Iterator, Mapping
+
+from fastapi.responses import Response, StreamingResponse
+
+# Cached recordings can be kept by browsers for as long as they like:
+CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+# Recordings are read and sent in chunks of this size:
+CHUNK_SIZE = 1024 * 1024
+
+# Fast rather than small: `.rrd` files are already partly compressed.
+GZIP_LEVEL = 1
+
+_RANGE_RE = re.compile(r"bytes=(\d*)-(\d*)")
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: str, size: int) -> tuple[int, int] | None:
+    """
+    The `[start, end)` bytes of a `Range` header, for a file of `size` bytes.
+
+    Returns `None` for headers that can't be served as a single range, in which case the whole file is
+    sent. Raises `RangeNotSatisfiable` for ranges that lie entirely beyond the end of the file.
+    """
+    match = _RANGE_RE.fullmatch(header.strip())
+    if match is None:
+        return None  # multiple ranges, or another unit
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        start, end = size - int(last), size  # the last bytes
+    else:
+        start = int(first)
+        if last and int(last) < start:
+            return None  # invalid, so ignored
+        end = min(int(last) + 1, size) if last else size
+    if start >= size or end <= start:
+        raise RangeNotSatisfiable(f"bytes={first}-{last} of {size} bytes")
+    start = max(start, 0)
+    return start, end
+
+
+def etag_matches(header: str, etag: str) -> bool:
+    """Whether an `If-None-Match` header matches `etag` (with the weak comparison it calls for)."""
+    tags = [tag.strip() for tag in header.split(",")]
+    return "*" in tags or _strong(etag) in (_strong(tag) for tag in tags)
+
+
+def _strong(etag: str) -> str:
+    """`etag` without its weakness indicator."""
+    return etag[2:] if etag.startswith("W/") else etag
+
+
+def accepts_gzip(header: str) -> bool:
+    """Whether an `Accept-Encoding` header accepts gzip."""
+    for coding in header.split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            quality = params.strip()
+            if quality.startswith("q="):
+                quality = quality[2:]
+            try:
+                return not params or float(quality) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def _read(file: BinaryIO, start: int, end: int) -> Iterator[bytes]:
+    with file:
+        file.seek(start)
+        remaining = end - start
+        while remaining > 0:
+            chunk = file.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                return
+            remaining -= len(chunk)
+            yield chunk
+
+
+def _gzip(chunks: Iterator[bytes]) -> Iterator[bytes]:
+    compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)  # gzip framing
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
+
+def recording_response(file: BinaryIO, digest: str, headers: Mapping[str, str], compress: bool = False) -> Response:
+    """
+    The response to a `GET` of a complete recording, given the request `headers`.
+
+    `file`: the recording, opened for reading. It is closed once the response is sent.
+    `digest`: a hash of the contents of the recording, to use as `ETag`.
+    `compress`: gzip the recording if the client accepts it. Range requests are always served uncompressed.
+    """
+    size = os.fstat(file.fileno()).st_size
+    byte_range = headers.get("range")
+    gzipped = compress and byte_range is None and accepts_gzip(headers.get("accept-encoding", ""))
+    etag = f'"{digest}-gzip"' if gzipped else f'"{digest}"'
+    response_headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL, "Accept-Ranges": "bytes"}
+    if compress:
+        response_headers["Vary"] = "Accept-Encoding"
+
+    if etag_matches(headers.get("if-none-match", ""), etag):
+        file.close()
+        return Response(status_code=304, headers=response_headers)
+
+    # A range of a different version of the file mustn't be combined with what the client already has:
+    if byte_range is not None and headers.get("if-range", etag) != etag:
+        byte_range = None
+
+    if byte_range is not None:
+        try:
+            span = parse_range(byte_range, size)
+        except RangeNotSatisfiable:
+            file.close()
+            return Response(status_code=416, headers={**response_headers, "Content-Range": f"bytes */{size}"})
+        if span is not None:
+            start, end = span
+            response_headers["Content-Range"] = f"bytes {start}-{end - 1}/{size}"
+            response_headers["Content-Length"] = str(end - start)
+            return StreamingResponse(
+                _read(file, start, end),
+                status_code=206,
+                media_type="application/octet-stream",
+                headers=response_headers,
+            )
+
+    if gzipped:
+        response_headers["Content-Encoding"] = "gzip"
+        return StreamingResponse(
+            _gzip(_read(file, 0, size)), media_type="application/octet-stream", headers=response_headers
+        )
+    response_headers["Content-Length"] = str(size)
+    return StreamingResponse(_read(file, 0, size), media_type="application/octet-stream", headers=response_headers)
@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+
+"""
+Benchmarks converting datasets to Rerun, fully offline.
+
+Synthetic datasets are generated locally, one per column type (scalars, lists, tensors, images, depth
+images and LeRobot-style videos). Each is converted to an `.rrd` file, in a fresh process per case so
+that peak memory use can be measured, and the results are reported as rows/s, MB/s of output, peak RSS
+and output size.
+
+Run it from the root of the repository:
+
+    python scripts/benchmark_conversion.py
+    python scripts/benchmark_conversion.py --rows 5000 --batch-sizes 0 1000 --output results.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import multiprocessing
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from batching import BATCHER_PRESETS  # noqa: E402
+from dataset_conversion import (  # noqa: E402
+    CONVERTER_VERSION,
+    log_dataset_to_rerun,
+    log_lerobot_dataset_to_rerun,
+    recording_to_file,
+)
+from pipeline import PipelineOptions  # noqa: E402
+from profiling import Profile, peak_rss_bytes  # noqa: E402
+from video_decoder import warm_up_encoder_pool  # noqa: E402
+
+COLUMN_TYPES = ["scalar", "list", "tensor", "image", "depth", "video"]
+
+NUM_SCALAR_COLUMNS = 8
+LIST_LENGTH = 14
+TENSOR_SHAPE = (4, 16, 16)
+IMAGE_SIZE = (320, 240)
+VIDEO_SIZE = (640, 480)
+VIDEO_FPS = 30
+NUM_CAMERAS = 2
+
+# How far rows are read ahead in the pipelined cases:
+PIPELINE_READ_AHEAD = 64
+
+
+@dataclass(frozen=True)
+class Case:
+    column_type: str
+    rows: int
+    batch_size: int
+    prefetch_rows: int = 0
+    jpeg_quality: int | None = None
+    encoded_images: bool = False
+    read_ahead: int = 0
+    convert_workers: int = 0
+    batcher: str = "default"
+
+    @property
+    def name(self) -> str:
+        name = f"{self.column_type}/batch={self.batch_size}"
+        if self.prefetch_rows:
+            name += f"/prefetch={self.prefetch_rows}"
+        if self.jpeg_quality is not None:
+            name += f"/jpeg={self.jpeg_quality}"
+        if self.encoded_images:
+            name += "/encoded"
+        if self.read_ahead or self.convert_workers:
+            name += f"/read_ahead={self.read_ahead}/workers={self.convert_workers}"
+        if self.batcher != "default":
+            name += f"/batcher={self.batcher}"
+        return name
+
+
+class SyntheticLeRobotDataset:
+    """The parts of a `LeRobotDataset` that `log_lerobot_dataset_to_rerun` uses, for a single episode."""
+
+    def __init__(self, hf_dataset: Any, videos_dir: Path) -> None:
+        self.hf_dataset = hf_dataset
+        self.episode_data_index = {"from": [0], "to": [len(hf_dataset)]}
+        self.videos_dir = videos_dir
+
+
+def _time_columns(rows: int) -> dict[str, list[Any]]:
+    return {
+        "index": list(range(rows)),
+        "frame_id": list(range(rows)),
+        "timestamp": [i / VIDEO_FPS for i in range(rows)],
+        "episode_index": [0] * rows,
+    }
+
+
+def _write_video(path: Path, num_frames: int, seed: int) -> None:
+    import cv2
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter.fourcc(*"mp4v"), VIDEO_FPS, VIDEO_SIZE)
+    width, height = VIDEO_SIZE
+    gradient = np.linspace(0, 255, width, dtype=np.uint8)[None, :, None]
+    for i in range(num_frames):
+        frame = np.broadcast_to(gradient, (height, width, 3)).copy()
+        frame[:, :, seed % 3] = (i * 5 + seed * 40) % 256  # changes every frame, like a real camera
+        writer.write(frame)
+    writer.release()
+
+
+def generate_dataset(column_type: str, rows: int, work_dir: Path) -> Path:
+    """Writes a synthetic dataset with columns of `column_type` to `work_dir`, returns its directory."""
+    import datasets
+    from PIL import Image
+
+    directory = work_dir / f"{column_type}_{rows}"
+    if directory.exists():
+        return directory
+    directory.mkdir(parents=True)
+
+    rng = np.random.default_rng(0)
+    columns: dict[str, Any] = _time_columns(rows)
+    features: dict[str, Any] = {
+        "index": datasets.Value("int64"),
+        "frame_id": datasets.Value("int64"),
+        "timestamp": datasets.Value("float32"),
+        "episode_index": datasets.Value("int64"),
+    }
+
+    if column_type == "scalar":
+        for i in range(NUM_SCALAR_COLUMNS):
+            columns[f"scalar_{i}"] = rng.standard_normal(rows).astype(np.float32).tolist()
+            features[f"scalar_{i}"] = datasets.Value("float32")
+    elif column_type == "list":
+        columns["action"] = rng.standard_normal((rows, LIST_LENGTH)).astype(np.float32).tolist()
+        features["action"] = datasets.Sequence(datasets.Value("float32"))
+    elif column_type == "tensor":
+        columns["tensor"] = rng.standard_normal((rows, *TENSOR_SHAPE)).astype(np.float32).tolist()
+        features["tensor"] = datasets.Array3D(TENSOR_SHAPE, "float32")
+    elif column_type == "image":
+        width, height = IMAGE_SIZE
+        columns["image"] = [
+            Image.fromarray(
+                np.broadcast_to(np.uint8(i % 256), (height, width, 3))
+                ^ rng.integers(0, 32, (height, width, 3), np.uint8)
+            )
+            for i in range(rows)
+        ]
+        features["image"] = datasets.Image()
+    elif column_type == "depth":
+        width, height = IMAGE_SIZE
+        ramp = np.linspace(0, 10_000, width, dtype=np.uint16)[None, :]
+        columns["depth"] = [
+            Image.fromarray(np.broadcast_to(ramp + np.uint16(i), (height, width)).copy()) for i in range(rows)
+        ]
+        features["depth"] = datasets.Image()
+    elif column_type == "video":
+        (directory / "videos").mkdir()
+        for camera in range(NUM_CAMERAS):
+            _write_video(directory / "videos" / f"camera_{camera}.mp4", rows, seed=camera)
+            # Frames are referenced by `{"path": …, "timestamp": …}` structs, like LeRobot does:
+            columns[f"observation.images.camera_{camera}"] = [
+                {"path": f"videos/camera_{camera}.mp4", "timestamp": i / VIDEO_FPS} for i in range(rows)
+            ]
+            features[f"observation.images.camera_{camera}"] = {
+                "path": datasets.Value("string"),
+                "timestamp": datasets.Value("float32"),
+            }
+    else:
+        raise ValueError(f"Unknown column type {column_type}")
+
+    dataset = datasets.Dataset.from_dict(columns, features=datasets.Features(features))
+    dataset.to_parquet(str(directory / "data.parquet"))
+    return directory
+
+
+def _directory_size(directory: Path) -> int:
+    return sum(path.stat().st_size for path in directory.rglob("*") if path.is_file())
+
+
+def run_case(case: Case, dataset_dir: Path, output_path: Path) -> dict[str, Any]:
+    """Converts the dataset of `case` to `output_path`, meant to be run in a fresh process."""
+    import datasets
+
+    dataset = datasets.load_dataset("parquet", data_files=str(dataset_dir / "data.parquet"), split="train")
+    if case.column_type == "tensor":
+        dataset = dataset.with_format("torch")  # tensors only exist as such in a tensor format
+    baseline_rss = peak_rss_bytes()
+    profile = Profile()
+    pipeline = PipelineOptions(read_ahead=case.read_ahead, convert_workers=case.convert_workers)
+
+    if case.jpeg_quality is not None:
+        warm_up_encoder_pool()  # started once and shared by all conversions, so not part of a conversion's time
+
+    start_time = time.perf_counter()
+    with recording_to_file(output_path, batcher=BATCHER_PRESETS[case.batcher]) as recording:
+        if case.column_type == "video":
+            log_lerobot_dataset_to_rerun(
+                SyntheticLeRobotDataset(dataset, dataset_dir / "videos"),
+                0,
+                batch_size=case.batch_size,
+                prefetch_rows=case.prefetch_rows,
+                jpeg_quality=case.jpeg_quality,
+                recording=recording,
+                profile=profile,
+                pipeline=pipeline,
+            )
+        else:
+            log_dataset_to_rerun(
+                dataset,
+                batch_size=case.batch_size,
+                encoded_images=case.encoded_images,
+                recording=recording,
+                profile=profile,
+                pipeline=pipeline,
+            )
+    seconds = time.perf_counter() - start_time
+
+    output_bytes = output_path.stat().st_size
+    output_path.unlink()
+    return {
+        "name": case.name,
+        **asdict(case),
+        "seconds": seconds,
+        "rows_per_second": case.rows / seconds,
+        "output_bytes": output_bytes,
+        "output_mb_per_second": output_bytes / 1e6 / seconds,
+        "source_bytes": _directory_size(dataset_dir),
+        "peak_rss_bytes": peak_rss_bytes(),
+        "baseline_rss_bytes": baseline_rss,
+        "stages": profile.report()["stages"],
+    }
+
+
+def make_cases(
+    column_types: list[str],
+    rows: int,
+    batch_sizes: list[int],
+    jpeg_quality: int | None,
+    convert_workers: int,
+    batchers: list[str],
+) -> list[Case]:
+    cases = []
+    for column_type in column_types:
+        for batch_size in batch_sizes:
+            if column_type == "video":
+                cases.append(Case(column_type, rows, batch_size))
+                cases.append(Case(column_type, rows, batch_size, prefetch_rows=16))
+                if jpeg_quality is not None:
+                    cases.append(Case(column_type, rows, batch_size, prefetch_rows=16, jpeg_quality=jpeg_quality))
+            else:
+                cases.append(Case(column_type, rows, batch_size))
+                if column_type in ("image", "depth"):
+                    cases.append(Case(column_type, rows, batch_size, encoded_images=True))
+            if convert_workers > 0:
+                prefetch_rows = 16 if column_type == "video" else 0
+                cases.append(
+                    Case(
+                        column_type,
+                        rows,
+                        batch_size,
+                        prefetch_rows=prefetch_rows,
+                        read_ahead=PIPELINE_READ_AHEAD,
+                        convert_workers=convert_workers,
+                    )
+                )
+            # After the first case of the column type, which also pays for caching the dataset as Arrow:
+            cases.extend(Case(column_type, rows, batch_size, batcher=batcher) for batcher in batchers)
+    return cases
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark converting synthetic datasets to Rerun, offline.")
+    parser.add_argument("--column-types", nargs="+", default=COLUMN_TYPES, choices=COLUMN_TYPES)
+    parser.add_argument("--rows", type=int, default=1000, help="Rows per dataset")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[0, 256], help="Batch sizes to compare")
+    parser.add_argument("--jpeg-quality", type=int, default=90, help="Also benchmark compressing video frames")
+    parser.add_argument(
+        "--convert-workers", type=int, default=2, help="Also benchmark a pipeline with this many converting threads"
+    )
+    parser.add_argument(
+        "--batchers",
+        nargs="+",
+        default=[],
+        choices=[name for name in BATCHER_PRESETS if name != "default"],
+        help="Also benchmark these batching presets",
+    )
+    parser.add_argument("--work-dir", type=Path, help="Where to keep the generated datasets, for reuse between runs")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    import datasets
+    import rerun as rr
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or Path(tmp_dir)
+        results = []
+        # A fresh process per case, so every case starts from a clean slate and gets its own peak RSS:
+        context = multiprocessing.get_context("spawn")
+        cases = make_cases(
+            args.column_types, args.rows, args.batch_sizes, args.jpeg_quality, args.convert_workers, args.batchers
+        )
+        for case in cases:
+            dataset_dir = generate_dataset(case.column_type, case.rows, work_dir)
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                result = executor.submit(run_case, case, dataset_dir, Path(tmp_dir) / "output.rrd").result()
+            results.append(result)
+            print(
+                f"{result['name']:<60} {result['rows_per_second']:>10.0f} rows/s "
+                f"{result['output_mb_per_second']:>8.1f} MB/s "
+                f"{result['output_bytes'] / 1e6:>9.1f} MB "
+                f"{result['peak_rss_bytes'] / 1e6:>8.0f} MB peak RSS",
+                file=sys.stderr,
+            )
+
+    report = {
+        "converter_version": CONVERTER_VERSION,
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "rerun": rr.__version__,
+        "datasets": datasets.__version__,
+        "results": results,
+    }
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
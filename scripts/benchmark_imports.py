@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+
+"""
+Measures how long it takes to import each entry point, in fresh interpreters.
+
+For every module this prints the median wall time of `python -c "import <module>"`, and the packages
+that take the longest to import according to `python -X importtime`.
+
+Run it from the root of the repository:
+
+    python scripts/benchmark_imports.py
+    python scripts/benchmark_imports.py --json > import_times.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Any
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_MODULES = ["main", "dataset_conversion", "convert_episodes", "app"]
+
+
+def time_import(module: str) -> float:
+    """Wall time (in seconds) to start a fresh interpreter and import `module`."""
+    start_time = time.perf_counter()
+    subprocess.run([sys.executable, "-c", f"import {module}"], cwd=ROOT, check=True, capture_output=True)
+    return time.perf_counter() - start_time
+
+
+def slowest_imports(module: str, count: int) -> list[tuple[str, float]]:
+    """The packages that importing `module` spends the most time on, in seconds (including their own imports)."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    packages: dict[str, float] = {}
+    for line in result.stderr.splitlines():
+        # Lines look like `import time: self [us] | cumulative | imported package`:
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        package = name.strip().split(".")[0]
+        if package != module:
+            packages[package] = max(packages.get(package, 0.0), int(cumulative) / 1e6)
+    return sorted(packages.items(), key=lambda item: item[1], reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Measure the import time of this repository's entry points.")
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="Modules to import")
+    parser.add_argument("--runs", type=int, default=5, help="Imports per module, the median is reported")
+    parser.add_argument("--top", type=int, default=5, help="How many of the slowest imports to list")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON")
+    args = parser.parse_args()
+
+    results: dict[str, Any] = {}
+    for module in args.modules:
+        try:
+            times = [time_import(module) for _ in range(args.runs)]
+        except subprocess.CalledProcessError as err:
+            results[module] = {"error": err.stderr.decode("utf-8", errors="replace").strip().splitlines()[-1]}
+            continue
+        results[module] = {
+            "median_seconds": statistics.median(times),
+            "min_seconds": min(times),
+            "slowest_imports": dict(slowest_imports(module, args.top)),
+        }
+
+    if args.json:
+        print(json.dumps({"python": sys.version.split()[0], "runs": args.runs, "modules": results}, indent=2))
+        return
+
+    for module, result in results.items():
+        if "error" in result:
+            print(f"{module}: failed to import ({result['error']})")
+            continue
+        print(f"{module}: {result['median_seconds']:.2f}s (min {result['min_seconds']:.2f}s)")
+        for name, seconds in result["slowest_imports"].items():
+            print(f"    {name:<30} {seconds:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
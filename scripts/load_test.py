@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+"""
+Load-tests the app, fully offline.
+
+A synthetic dataset is generated locally and served to the app through its dataset mirror (see
+`DATASET_SOURCE`), instead of the Hub. The app is started with `uvicorn`, and a number of simulated users
+send a mix of requests at once:
+
+- `hit`: an episode that was converted before the test, served from the recording cache.
+- `cold`: an episode nobody asked for yet, converted on request.
+- `duplicate`: an episode that several users ask for at the same time, converted once.
+
+Every request goes through `show_dataset` like the UI does, then downloads the recording like the viewer
+does. The report has the p50/p95/p99 latency per kind of request, throughput, error rate and the peak
+memory of the app.
+
+Run it from the root of the repository:
+
+    python scripts/load_test.py
+    python scripts/load_test.py --users 16 --requests 400 --workers 2 --output load_test.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import queue
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+ROOT = Path(__file__).resolve().parent.parent
+
+DATASET_ID = "synthetic/load_test"
+REQUEST_KINDS = ["hit", "cold", "duplicate"]
+
+IMAGE_SIZE = (320, 240)
+FPS = 30
+
+# How often the memory of the app is sampled, in seconds:
+MEMORY_SAMPLE_INTERVAL = 0.2
+
+
+@dataclass(frozen=True)
+class Request:
+    kind: str
+    episode_index: int
+
+
+def generate_source(source_dir: Path, episodes: int, rows_per_episode: int) -> None:
+    """Writes a dataset with scalar, list and image columns, laid out like on the Hub, to `source_dir`."""
+    import datasets
+    from PIL import Image
+
+    data_dir = source_dir / DATASET_ID / "data"
+    if data_dir.exists():
+        return
+    data_dir.mkdir(parents=True)
+
+    rng = np.random.default_rng(0)
+    rows = episodes * rows_per_episode
+    width, height = IMAGE_SIZE
+    noise = rng.integers(0, 32, (height, width, 3), np.uint8)
+    features = datasets.Features({
+        "episode_index": datasets.Value("int64"),
+        "frame_index": datasets.Value("int64"),
+        "timestamp": datasets.Value("float32"),
+        "state": datasets.Sequence(datasets.Value("float32")),
+        "reward": datasets.Value("float32"),
+        "image": datasets.Image(),
+    })
+
+    # A shard per 100 episodes, so that episodes are spread over several files like in larger datasets:
+    for shard, first in enumerate(range(0, episodes, 100)):
+        episode_indices = np.arange(first, min(first + 100, episodes))
+        frame_indices = np.tile(np.arange(rows_per_episode), len(episode_indices))
+        columns = {
+            "episode_index": np.repeat(episode_indices, rows_per_episode).tolist(),
+            "frame_index": frame_indices.tolist(),
+            "timestamp": (frame_indices / FPS).tolist(),
+            "state": rng.standard_normal((len(frame_indices), 8)).astype(np.float32).tolist(),
+            "reward": rng.random(len(frame_indices)).astype(np.float32).tolist(),
+            "image": [Image.fromarray(noise ^ np.uint8(i % 256)) for i in frame_indices],
+        }
+        dataset = datasets.Dataset.from_dict(columns, features=features)
+        num_shards = (episodes + 99) // 100
+        dataset.to_parquet(str(data_dir / f"train-{shard:05d}-of-{num_shards:05d}.parquet"))
+    print(f"Generated {episodes} episodes of {rows_per_episode} rows ({rows} rows)", file=sys.stderr)
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port: int = sock.getsockname()[1]
+        return port
+
+
+def start_app(work_dir: Path, source_dir: Path, port: int, workers: int) -> subprocess.Popen[bytes]:
+    """Starts the app on `port`, with its recording cache and dataset mirror in `work_dir`."""
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.pathsep.join([str(ROOT), os.environ.get("PYTHONPATH", "")]),
+        "DATASET_MIRROR": str(work_dir / "mirror"),
+        "DATASET_SOURCE": str(source_dir),
+        "HF_HUB_OFFLINE": "1",
+    }
+    command = [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers)]
+    log = open(work_dir / "app.log", "wb")  # noqa: SIM115, closed with the process
+    # Run from `work_dir`, so that the recording cache (`tmp/`) starts out empty:
+    return subprocess.Popen(command, cwd=work_dir, env=env, stdout=log, stderr=subprocess.STDOUT)
+
+
+def wait_until_ready(base_url: str, process: subprocess.Popen[bytes], timeout: float = 120.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"The app exited with code {process.returncode}, see app.log")
+        try:
+            with urllib.request.urlopen(f"{base_url}/cache_stats", timeout=1):
+                return
+        except OSError:
+            time.sleep(0.5)
+    raise TimeoutError(f"The app didn't start within {timeout:.0f}s")
+
+
+def get_json(url: str) -> Any:
+    with urllib.request.urlopen(url, timeout=30) as response:
+        return json.load(response)
+
+
+def _process_tree(pid: int) -> list[int]:
+    """`pid` and all its descendants (on Linux)."""
+    pids = [pid]
+    for parent in pids:  # grows while iterating
+        for task in Path(f"/proc/{parent}/task").glob("*"):
+            try:
+                pids.extend(int(child) for child in (task / "children").read_text().split())
+            except OSError:
+                pass
+    return pids
+
+
+def _rss_bytes(pid: int) -> int:
+    try:
+        with open(f"/proc/{pid}/status", encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return 0
+
+
+class MemorySampler:
+    """Samples the resident memory of a process and its children on a background thread, keeping the peak."""
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.peak_bytes = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="memory-sampler", daemon=True)
+
+    def _run(self) -> None:
+        while not self._stop.wait(MEMORY_SAMPLE_INTERVAL):
+            self.peak_bytes = max(self.peak_bytes, sum(_rss_bytes(pid) for pid in _process_tree(self.pid)))
+
+    def __enter__(self) -> MemorySampler:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self._stop.set()
+        self._thread.join()
+
+
+def plan_requests(
+    num_requests: int, mix: dict[str, float], warm_episodes: int, duplicates: int, rng: random.Random
+) -> list[Request]:
+    """
+    `num_requests` requests, mixed according to the weights of `mix`.
+
+    Episodes `[0, warm_episodes)` are the cached ones, cold and duplicated episodes follow. The requests of a
+    duplicated episode are next to each other, so that they are sent at about the same time.
+    """
+    # Weights are of requests, a duplicated episode is several requests:
+    weights = [weight / duplicates if kind == "duplicate" else weight for kind, weight in mix.items()]
+    units: list[list[Request]] = []
+    next_episode = warm_episodes
+    planned = 0
+    while planned < num_requests:
+        kind = rng.choices(list(mix), weights=weights)[0]
+        if kind == "hit":
+            units.append([Request("hit", rng.randrange(warm_episodes))])
+        elif kind == "cold":
+            units.append([Request("cold", next_episode)])
+            next_episode += 1
+        else:
+            units.append([Request("duplicate", next_episode)] * duplicates)
+            next_episode += 1
+        planned += len(units[-1])
+    rng.shuffle(units)
+    return [request for unit in units for request in unit][:num_requests]
+
+
+def send_request(client: Any, base_url: str, episode_index: int, quick_preview: bool) -> int:
+    """Asks the app for an episode like the UI does, then downloads the recording like the viewer. Returns its size."""
+    # `show_dataset(dataset_id, episode_index, batch_size, encoded_images, quick_preview, stream)`:
+    _, recording_url = client.predict(DATASET_ID, episode_index, 0, True, quick_preview, True, api_name="/show_dataset")
+    num_bytes = 0
+    with urllib.request.urlopen(f"{base_url}/{recording_url}", timeout=600) as response:
+        while chunk := response.read(1024 * 1024):
+            num_bytes += len(chunk)
+    return num_bytes
+
+
+def run_load(
+    base_url: str, requests: list[Request], users: int, quick_preview: bool
+) -> tuple[list[dict[str, Any]], float]:
+    """Sends `requests` from `users` concurrent users, returns the result of every request and the wall time."""
+    from gradio_client import Client
+
+    pending: queue.Queue[Request] = queue.Queue()
+    for request in requests:
+        pending.put(request)
+    results: list[dict[str, Any]] = []
+    results_lock = threading.Lock()
+
+    def user() -> None:
+        client = Client(base_url, verbose=False)
+        while True:
+            try:
+                request = pending.get_nowait()
+            except queue.Empty:
+                return
+            start_time = time.perf_counter()
+            result: dict[str, Any] = {"kind": request.kind, "episode_index": request.episode_index, "error": None}
+            try:
+                result["bytes"] = send_request(client, base_url, request.episode_index, quick_preview)
+            except Exception as err:
+                result["error"] = repr(err)
+            result["seconds"] = time.perf_counter() - start_time
+            with results_lock:
+                results.append(result)
+
+    start_time = time.perf_counter()
+    threads = [threading.Thread(target=user, name=f"user-{i}") for i in range(users)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results, time.perf_counter() - start_time
+
+
+def latency_stats(results: list[dict[str, Any]]) -> dict[str, Any]:
+    seconds = np.array([result["seconds"] for result in results if result["error"] is None])
+    errors = sum(result["error"] is not None for result in results)
+    stats: dict[str, Any] = {"requests": len(results), "errors": errors, "error_rate": errors / max(len(results), 1)}
+    if len(seconds):
+        p50, p95, p99 = np.percentile(seconds, [50, 95, 99])
+        stats.update(
+            p50_seconds=float(p50), p95_seconds=float(p95), p99_seconds=float(p99), max_seconds=float(seconds.max())
+        )
+    return stats
+
+
+def git_commit() -> str | None:
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return result.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load-test the app with a synthetic, local dataset.")
+    parser.add_argument("--users", type=int, default=8, help="Concurrent users")
+    parser.add_argument("--requests", type=int, default=100, help="Requests to send in total")
+    parser.add_argument(
+        "--mix",
+        type=float,
+        nargs=3,
+        default=[0.6, 0.3, 0.1],
+        metavar=("HIT", "COLD", "DUPLICATE"),
+        help="Weights of the kinds of requests",
+    )
+    parser.add_argument("--duplicates", type=int, default=4, help="Users that ask for each duplicated episode")
+    parser.add_argument("--warm-episodes", type=int, default=10, help="Episodes converted before the test")
+    parser.add_argument("--rows", type=int, default=300, help="Rows per episode")
+    parser.add_argument("--full", action="store_true", help="Convert full episodes, instead of quick previews")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--work-dir", type=Path, help="Where to keep the dataset, mirror and app log")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    mix = dict(zip(REQUEST_KINDS, args.mix))
+    if args.warm_episodes == 0:
+        mix["hit"] = 0.0  # nothing is cached
+    requests = plan_requests(args.requests, mix, args.warm_episodes, args.duplicates, rng)
+    episodes = max([args.warm_episodes - 1, *(request.episode_index for request in requests)]) + 1
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or Path(tmp_dir)
+        work_dir.mkdir(parents=True, exist_ok=True)
+        source_dir = work_dir / "source"
+        generate_source(source_dir, episodes, args.rows)
+
+        port = free_port()
+        base_url = f"http://127.0.0.1:{port}"
+        process = start_app(work_dir, source_dir, port, args.workers)
+        try:
+            wait_until_ready(base_url, process)
+            from gradio_client import Client
+
+            print(f"Converting {args.warm_episodes} episodes ahead of the test…", file=sys.stderr)
+            client = Client(base_url, verbose=False)
+            for episode_index in range(args.warm_episodes):
+                send_request(client, base_url, episode_index, not args.full)
+
+            print(f"Sending {len(requests)} requests from {args.users} users…", file=sys.stderr)
+            with MemorySampler(process.pid) as sampler:
+                results, seconds = run_load(base_url, requests, args.users, not args.full)
+            metrics = get_json(f"{base_url}/metrics")
+            cache_stats = get_json(f"{base_url}/cache_stats")
+        finally:
+            process.terminate()
+            process.wait()
+
+    report = {
+        "git_commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "seconds": seconds,
+        "throughput_requests_per_second": len(results) / seconds,
+        "peak_rss_bytes": sampler.peak_bytes,
+        "overall": latency_stats(results),
+        "kinds": {kind: latency_stats([r for r in results if r["kind"] == kind]) for kind in REQUEST_KINDS},
+        "app_metrics": metrics,
+        "cache_stats": cache_stats,
+        "errors": sorted({result["error"] for result in results if result["error"] is not None}),
+    }
+
+    for name, stats in [("overall", report["overall"]), *report["kinds"].items()]:
+        if "p50_seconds" in stats:
+            print(
+                f"{name:<10} {stats['requests']:>5} requests  p50 {stats['p50_seconds']:>7.2f}s  "
+                f"p95 {stats['p95_seconds']:>7.2f}s  p99 {stats['p99_seconds']:>7.2f}s  "
+                f"errors {stats['error_rate']:.1%}",
+                file=sys.stderr,
+            )
+    print(
+        f"{report['throughput_requests_per_second']:.2f} requests/s, peak memory {report['peak_rss_bytes'] / 1e6:.0f} MB",
+        file=sys.stderr,
+    )
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
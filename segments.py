@@ -0,0 +1,174 @@
+"""
+Conversions split into segments of rows, each cached as its own `.rrd` file.
+
+An interrupted conversion only loses the segment it was working on, and conversions of overlapping
+windows of an episode share the segments they have in common. The segments of a conversion are parts of
+the same recording, and are joined into one file as they are converted.
+"""
+
+from __future__ import annotations
+
+import logging
+import shutil
+import threading
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, BinaryIO, Callable, Iterable
+
+from dataset_conversion import Preview
+from rrd_cache import RrdCache
+
+logger = logging.getLogger(__name__)
+
+# Rows per segment. Smaller segments lose less work when interrupted, but cost more to start (e.g. seeking videos).
+SEGMENT_ROWS = 1000
+
+# `.rrd` files are a header (magic bytes, SDK version and encoding options) followed by self-delimiting
+# messages, so files written by the same SDK version are joined by dropping all but the first header:
+RRD_HEADER_SIZE = 12
+
+COPY_CHUNK_SIZE = 1024 * 1024
+
+# How often a segment that is being converted is checked for new data to copy into its recording:
+TAIL_POLL_INTERVAL = 0.05
+
+
+def segment_ranges(
+    num_rows: int, preview: Preview | None = None, segment_rows: int = SEGMENT_ROWS
+) -> list[tuple[int, int]] | None:
+    """
+    The `[start, stop)` rows of every segment of a conversion of `num_rows` rows.
+
+    Segments are aligned to multiples of `segment_rows`, so that other windows share them, and clipped to
+    the window of `preview`. Returns `None` for windows in seconds, which can't be mapped to rows up front.
+    """
+    start, end = (preview.start, preview.end) if preview is not None else (None, None)
+    if isinstance(start, float) or isinstance(end, float):
+        return None
+    start = max(start or 0, 0)
+    end = num_rows if end is None else min(end, num_rows)
+    return [
+        (max(first, start), min(first + segment_rows, end))
+        for first in range(start - start % segment_rows, end, segment_rows)
+    ]
+
+
+def segment_preview(preview: Preview | None, start: int, stop: int) -> Preview:
+    """
+    What to log of the rows `[start, stop)`, in a conversion with `preview`.
+
+    Strides and rates start over at every segment, so rows near the start of a segment may be spaced
+    differently than in a conversion in one piece.
+    """
+    return replace(preview or Preview(), start=start, end=stop)
+
+
+def write_segments(path: Path, cache: RrdCache, segments: Iterable[tuple[str, Callable[[Path], None]]]) -> int:
+    """
+    Joins the segments of a recording into `path`, converting the ones that aren't cached yet.
+
+    `segments`: in order, the cache key of every segment and the function that converts it (see
+    `RrdCache.get_or_create`). Segments are copied into `path` while they are converted, so that it
+    can be streamed while it is being written.
+
+    Returns the number of segments that were converted rather than taken from the cache.
+    """
+    header: bytes | None = None
+    converted = 0
+    with open(path, "wb") as output:
+        for key, create in segments:
+            streamed: _Tail | None = None
+
+            def create_segment(segment_path: Path, create: Callable[[Path], None] = create) -> None:
+                nonlocal converted, streamed
+                converted += 1
+                streamed = _Tail(segment_path, output, skip=RRD_HEADER_SIZE if header is not None else 0)
+                with streamed:
+                    create(segment_path)
+
+            for _ in range(3):
+                segment_path = cache.get_or_create(key, create_segment)
+                if streamed is not None:
+                    header = header or streamed.header
+                    break
+                try:
+                    file = open(segment_path, "rb")
+                except FileNotFoundError:
+                    continue  # evicted in the meantime
+                with file:
+                    segment_header = file.read(RRD_HEADER_SIZE)
+                    if header is None or segment_header == header:
+                        if header is None:
+                            header = segment_header
+                            output.write(header)
+                        shutil.copyfileobj(file, output, COPY_CHUNK_SIZE)
+                        break
+                logger.info(f"Converting segment {key} again, it was written by another version of the Rerun SDK")
+                segment_path.unlink(missing_ok=True)
+            else:
+                raise RuntimeError(f"Failed to convert segment {key}")
+            output.flush()
+    return converted
+
+
+class _Tail:
+    """
+    Copies what is written to `source` into `output` while it is being written, on a thread.
+
+    Copying starts on entering the context and ends on exit, once everything written to `source` so far
+    is copied. `skip`: the number of bytes at the start of `source` that aren't copied. The first
+    `RRD_HEADER_SIZE` bytes of `source` are kept in `header`.
+    """
+
+    def __init__(self, source: Path, output: BinaryIO, skip: int = 0) -> None:
+        self.source = source
+        self.output = output
+        self.skip = skip
+        self.header = b""
+        self._done = threading.Event()
+        self._error: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="segment-tail", daemon=True)
+
+    def __enter__(self) -> _Tail:
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type: type[BaseException] | None, *args: Any) -> None:
+        self._done.set()
+        self._thread.join()
+        if self._error is not None and exc_type is None:
+            raise self._error
+
+    def _run(self) -> None:
+        try:
+            self._copy()
+        except BaseException as err:
+            self._error = err
+
+    def _copy(self) -> None:
+        while True:
+            try:
+                file = open(self.source, "rb")
+                break
+            except FileNotFoundError:
+                if self._done.is_set():
+                    return
+                self._done.wait(TAIL_POLL_INTERVAL)
+
+        with file:
+            skip = self.skip
+            while True:
+                done = self._done.is_set()  # checked before reading, so that nothing written before the end is missed
+                chunk = file.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    if done:
+                        return
+                    self._done.wait(TAIL_POLL_INTERVAL)
+                    continue
+                if len(self.header) < RRD_HEADER_SIZE:
+                    self.header += chunk[: RRD_HEADER_SIZE - len(self.header)]
+                if skip:
+                    skipped = min(skip, len(chunk))
+                    chunk, skip = chunk[skipped:], skip - skipped
+                self.output.write(chunk)
+                self.output.flush()
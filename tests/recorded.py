@@ -0,0 +1,52 @@
+"""Reads back what was logged to `.rrd` files, to compare recordings in tests."""
+
+from __future__ import annotations
+
+import re
+import subprocess
+import sys
+from collections import Counter
+from pathlib import Path
+
+# Columns that differ between recordings of the same data, or only depend on how it was logged:
+_IGNORED_COLUMNS = {"RowId", "log_tick", "log_time"}
+
+_ROW_RE = re.compile(r"│ │ [0-9A-F]{32} ┆")
+
+
+def recorded_rows(path: Path) -> Counter[tuple[str, frozenset[tuple[str, str]]]]:
+    """
+    Every row logged to the recording at `path`, as its entity path and the printed values of its columns.
+
+    Only times on the timelines of the data and data components are kept, so that recordings of the same
+    data compare equal, whether it was logged row by row or sent in batches.
+    """
+    printed = subprocess.run(
+        [sys.executable, "-m", "rerun", "rrd", "print", "--verbose", str(path)],
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+    rows: Counter[tuple[str, frozenset[tuple[str, str]]]] = Counter()
+    entity_path = ""
+    columns: list[str] | None = None
+    for line in printed.splitlines():
+        if "* entity_path:" in line:
+            entity_path = line.split('"')[1]
+            columns = None
+        elif columns is None and "┆" in line:
+            columns = _cells(line)  # the first line of the header
+        elif columns is not None and _ROW_RE.search(line):
+            cells = {
+                column: value
+                for column, value in zip(columns, _cells(line))
+                if column not in _IGNORED_COLUMNS and not column.endswith("Indicator") and value
+            }
+            if cells:
+                rows[(entity_path, frozenset(cells.items()))] += 1
+    return rows
+
+
+def _cells(line: str) -> list[str]:
+    return [cell.strip() for cell in line.strip().strip("│").strip().strip("│").split("┆")]
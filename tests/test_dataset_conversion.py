@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+import pytest
+from datasets import Dataset
+from recorded import recorded_rows
+
+from dataset_conversion import log_dataset_to_rerun, recording_to_file
+
+
+def _convert(dataset: Dataset, path: Path, batch_size: int) -> None:
+    with recording_to_file(path, recording_id="test") as recording:
+        log_dataset_to_rerun(dataset, batch_size=batch_size, recording=recording)
+
+
+def _dataset(frame_ids: list[Any], timestamps: list[Any]) -> Dataset:
+    num_rows = len(frame_ids)
+    return Dataset.from_dict({
+        "frame_id": frame_ids,
+        "timestamp": timestamps,
+        "reward": np.arange(num_rows) * 0.5,
+        "state": np.arange(num_rows * 3, dtype=np.float32).reshape(num_rows, 3),
+        "task": ["push", "pull", "lift"] * (num_rows // 3) + ["push"] * (num_rows % 3),
+    })
+
+
+@pytest.mark.parametrize("batch_size", [4, 64])
+def test_batches_log_the_same_rows_as_row_by_row(tmp_path: Path, batch_size: int) -> None:
+    dataset = _dataset(list(range(10)), [i / 10 for i in range(10)])
+    _convert(dataset, tmp_path / "rows.rrd", batch_size=0)
+    _convert(dataset, tmp_path / "batches.rrd", batch_size=batch_size)
+
+    rows = recorded_rows(tmp_path / "rows.rrd")
+    assert sum(rows.values()) == 3 * 10
+    assert recorded_rows(tmp_path / "batches.rrd") == rows
+
+
+@pytest.mark.parametrize("batch_size", [0, 4])
+def test_rows_missing_a_time_are_logged_without_it(tmp_path: Path, batch_size: int) -> None:
+    dataset = _dataset([0, 1, None, 3, 4, None], [0.0, 0.1, 0.2, None, 0.4, 0.5])
+    _convert(dataset, tmp_path / "rows.rrd", batch_size=0)
+    _convert(dataset, tmp_path / "batches.rrd", batch_size=batch_size)
+
+    rows = recorded_rows(tmp_path / "rows.rrd")
+    assert recorded_rows(tmp_path / "batches.rrd") == rows
+
+    reward_times = sorted(
+        (dict(cells).get("frame_id", ""), "timestamp" in dict(cells))
+        for (entity_path, cells), count in rows.items()
+        for _ in range(count)
+        if entity_path == "/reward"
+    )
+    # Neither at the time of the row before, nor at the smallest time there is:
+    assert reward_times == [("", True), ("", True), ("0", True), ("1", True), ("3", False), ("4", True)]
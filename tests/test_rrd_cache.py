@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
+import pytest
+
+from rrd_cache import KeyLocks, RrdCache
+
+
+def _write(size: int) -> Callable[[Path], None]:
+    def create(path: Path) -> None:
+        path.write_bytes(b"x" * size)
+
+    return create
+
+
+def _age(cache: RrdCache, key: str, seconds: float) -> None:
+    mtime = time.time() - seconds
+    os.utime(cache.path(key), (mtime, mtime))
+
+
+def test_get_or_create(tmp_path: Path) -> None:
+    cache = RrdCache(tmp_path)
+    assert cache.get("a") is None
+
+    path = cache.get_or_create("a", _write(10))
+    assert path == cache.path("a")
+    assert path.read_bytes() == b"x" * 10
+    assert cache.get_or_create("a", _write(20)) == path
+    assert path.read_bytes() == b"x" * 10
+    assert cache.stats() == {"hits": 1, "misses": 1, "evictions": 0, "entries": 1, "bytes": 10}
+
+
+def test_failed_creation_isnt_cached(tmp_path: Path) -> None:
+    cache = RrdCache(tmp_path)
+
+    def create(path: Path) -> None:
+        path.write_bytes(b"partial")
+        raise RuntimeError("conversion failed")
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_create("a", create)
+    assert cache.get("a") is None
+    assert cache.in_progress_path("a") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_evicts_least_recently_used(tmp_path: Path) -> None:
+    cache = RrdCache(tmp_path, max_bytes=250)
+    for age, key in enumerate(["c", "b", "a"]):
+        cache.get_or_create(key, _write(100))
+        _age(cache, key, 100 * (age + 1))
+    cache.get("a")  # used last, although created first
+
+    cache.get_or_create("d", _write(100))
+    assert [key for key in "abcd" if cache.get(key) is not None] == ["a", "d"]
+    assert cache.evictions == 2
+
+
+def test_evicts_expired(tmp_path: Path) -> None:
+    cache = RrdCache(tmp_path, max_age_seconds=60)
+    cache.get_or_create("old", _write(10))
+    cache.get_or_create("new", _write(10))
+    _age(cache, "old", 120)
+    (tmp_path / "crashed.1234.tmp").write_bytes(b"partial")
+    os.utime(tmp_path / "crashed.1234.tmp", (time.time() - 120,) * 2)
+
+    cache.evict()
+    assert cache.get("old") is None
+    assert cache.get("new") is not None
+    assert sorted(path.name for path in tmp_path.iterdir()) == ["new.rrd"]
+
+
+def test_keeps_the_recording_it_created(tmp_path: Path) -> None:
+    cache = RrdCache(tmp_path, max_bytes=50)
+    path = cache.get_or_create("large", _write(100))
+    assert path.exists()
+
+
+def test_creates_once_for_concurrent_requests(tmp_path: Path) -> None:
+    cache = RrdCache(tmp_path)
+    created = []
+
+    def create(path: Path) -> None:
+        created.append(path)
+        time.sleep(0.1)
+        path.write_bytes(b"x")
+
+    with ThreadPoolExecutor(8) as executor:
+        paths = list(executor.map(lambda _: cache.get_or_create("a", create), range(8)))
+    assert len(created) == 1
+    assert paths == [cache.path("a")] * 8
+    assert cache.stats()["misses"] == 1
+
+
+def test_key_locks() -> None:
+    locks = KeyLocks()
+    inside = 0
+    max_inside = 0
+    counter_lock = threading.Lock()
+
+    def work(key: str) -> None:
+        nonlocal inside, max_inside
+        with locks.hold(key):
+            with counter_lock:
+                inside += 1
+                max_inside = max(max_inside, inside)
+            time.sleep(0.01)
+            with counter_lock:
+                inside -= 1
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(work, ["a"] * 8))
+    assert max_inside == 1  # one holder at a time
+    assert len(locks) == 0  # and no lock left behind
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(work, "abcdefgh"))
+    assert max_inside > 1  # other keys don't wait
+    assert len(locks) == 0
+
+
+def test_key_locks_released_on_error() -> None:
+    locks = KeyLocks()
+    with pytest.raises(ValueError), locks.hold("a"):
+        raise ValueError
+    assert len(locks) == 0
+    with locks.hold("a"):
+        assert len(locks) == 1
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from fastapi import FastAPI, Request, Response
+from fastapi.testclient import TestClient
+
+from rrd_response import RangeNotSatisfiable, accepts_gzip, etag_matches, parse_range, recording_response
+
+SIZE = 1000
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("bytes=0-99", (0, 100)),
+        ("bytes=900-", (900, SIZE)),
+        ("bytes=-100", (900, SIZE)),
+        ("bytes=-5000", (0, SIZE)),
+        ("bytes=500-5000", (500, SIZE)),
+        ("bytes=999-999", (999, SIZE)),
+        (" bytes=10-19 ", (10, 20)),
+        # Served as the whole file:
+        ("bytes=0-9,20-29", None),
+        ("items=0-9", None),
+        ("bytes=20-10", None),
+        ("bytes=-", None),
+    ],
+)
+def test_parse_range(header: str, expected: tuple[int, int] | None) -> None:
+    assert parse_range(header, SIZE) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=1000-2000", "bytes=-0"])
+def test_parse_range_beyond_the_end(header: str) -> None:
+    with pytest.raises(RangeNotSatisfiable):
+        parse_range(header, SIZE)
+
+
+@pytest.mark.parametrize(
+    ("header", "etag", "expected"),
+    [
+        ('"abc"', '"abc"', True),
+        ('W/"abc"', '"abc"', True),
+        ('"abc"', 'W/"abc"', True),
+        ('"xyz", "abc"', '"abc"', True),
+        ("*", '"abc"', True),
+        ('"xyz"', '"abc"', False),
+        ('"abc-gzip"', '"abc"', False),
+        ("", '"abc"', False),
+    ],
+)
+def test_etag_matches(header: str, etag: str, expected: bool) -> None:
+    assert etag_matches(header, etag) == expected
+
+
+@pytest.mark.parametrize(
+    ("header", "expected"),
+    [
+        ("gzip", True),
+        ("br, GZIP", True),
+        ("gzip;q=0.5", True),
+        ("*", True),
+        ("gzip;q=0", False),
+        ("gzip;q=x", False),
+        ("identity, br", False),
+        ("", False),
+    ],
+)
+def test_accepts_gzip(header: str, expected: bool) -> None:
+    assert accepts_gzip(header) == expected
+
+
+@pytest.fixture
+def client(tmp_path: Path) -> TestClient:
+    path = tmp_path / "recording.rrd"
+    path.write_bytes(bytes(range(256)) * 4)
+
+    app = FastAPI()
+
+    @app.get("/recording.rrd")
+    def recording(request: Request) -> Response:
+        return recording_response(open(path, "rb"), "digest", request.headers, compress=True)
+
+    return TestClient(app)
+
+
+def test_recording_response(client: TestClient) -> None:
+    response = client.get("/recording.rrd", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == bytes(range(256)) * 4
+    assert response.headers["ETag"] == '"digest"'
+    assert response.headers["Content-Length"] == "1024"
+
+
+def test_recording_response_not_modified(client: TestClient) -> None:
+    response = client.get("/recording.rrd", headers={"Accept-Encoding": "identity", "If-None-Match": '"digest"'})
+    assert response.status_code == 304
+    assert response.content == b""
+
+
+def test_recording_response_range(client: TestClient) -> None:
+    response = client.get("/recording.rrd", headers={"Range": "bytes=256-511"})
+    assert response.status_code == 206
+    assert response.content == bytes(range(256))
+    assert response.headers["Content-Range"] == "bytes 256-511/1024"
+    assert "Content-Encoding" not in response.headers
+
+
+def test_recording_response_range_not_satisfiable(client: TestClient) -> None:
+    response = client.get("/recording.rrd", headers={"Range": "bytes=2000-"})
+    assert response.status_code == 416
+    assert response.headers["Content-Range"] == "bytes */1024"
+
+
+def test_recording_response_range_of_another_version(client: TestClient) -> None:
+    response = client.get(
+        "/recording.rrd", headers={"Accept-Encoding": "identity", "Range": "bytes=0-9", "If-Range": '"other"'}
+    )
+    assert response.status_code == 200
+    assert len(response.content) == 1024
+
+
+def test_recording_response_gzip(client: TestClient) -> None:
+    response = client.get("/recording.rrd", headers={"Accept-Encoding": "gzip"})
+    assert response.status_code == 200
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert response.headers["ETag"] == '"digest-gzip"'
+    assert response.content == bytes(range(256)) * 4  # decompressed by the client
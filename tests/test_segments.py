@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from functools import partial
+from pathlib import Path
+
+import numpy as np
+import pytest
+from datasets import Dataset
+from recorded import recorded_rows
+
+from dataset_conversion import Preview, log_dataset_to_rerun, recording_to_file
+from rrd_cache import RrdCache
+from segments import segment_preview, segment_ranges, write_segments
+
+
+@pytest.mark.parametrize(
+    ("num_rows", "preview", "expected"),
+    [
+        (250, None, [(0, 100), (100, 200), (200, 250)]),
+        (200, None, [(0, 100), (100, 200)]),
+        (50, None, [(0, 50)]),
+        (0, None, []),
+        (250, Preview(start=150), [(150, 200), (200, 250)]),
+        (250, Preview(end=120), [(0, 100), (100, 120)]),
+        (250, Preview(start=120, end=180), [(120, 180)]),
+        (250, Preview(start=-10, end=1000), [(0, 100), (100, 200), (200, 250)]),
+        (250, Preview(start=300), []),
+        (250, Preview(stride=5), [(0, 100), (100, 200), (200, 250)]),
+    ],
+)
+def test_segment_ranges(num_rows: int, preview: Preview | None, expected: list[tuple[int, int]]) -> None:
+    assert segment_ranges(num_rows, preview, segment_rows=100) == expected
+
+
+def test_segment_ranges_of_windows_in_seconds() -> None:
+    assert segment_ranges(250, Preview(start=1.0, end=2.0), segment_rows=100) is None
+
+
+def test_overlapping_windows_share_segments() -> None:
+    first = segment_ranges(1000, Preview(start=0, end=450), segment_rows=100)
+    second = segment_ranges(1000, Preview(start=250, end=700), segment_rows=100)
+    assert first is not None and second is not None
+    assert set(first) & set(second) == {(300, 400)}
+
+
+def _convert(dataset: Dataset, preview: Preview | None, path: Path) -> None:
+    with recording_to_file(path, recording_id="test") as recording:
+        log_dataset_to_rerun(dataset, preview=preview, recording=recording)
+
+
+def test_joined_segments_match_a_whole_conversion(tmp_path: Path) -> None:
+    dataset = Dataset.from_dict({"frame_id": np.arange(250), "reward": np.arange(250) * 0.5})
+    whole = tmp_path / "whole.rrd"
+    _convert(dataset, None, whole)
+
+    cache = RrdCache(tmp_path / "segments")
+    ranges = segment_ranges(len(dataset), segment_rows=100)
+    assert ranges is not None
+    segments = [
+        (f"segment_{start}", partial(_convert, dataset, segment_preview(None, start, stop))) for start, stop in ranges
+    ]
+
+    joined = tmp_path / "joined.rrd"
+    assert write_segments(joined, cache, segments) == 3
+    rows = recorded_rows(whole)
+    assert sum(rows.values()) == 250
+    assert recorded_rows(joined) == rows
+
+    # From the cache this time:
+    rejoined = tmp_path / "rejoined.rrd"
+    assert write_segments(rejoined, cache, segments) == 0
+    assert rejoined.read_bytes() == joined.read_bytes()
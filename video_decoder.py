@@ -0,0 +1,357 @@
+"""Seekable video frame decoding with a bounded, least-recently-used frame cache, and frame compression."""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing
+import multiprocessing.util
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Any, Callable, Iterable, Iterator, TypeVar
+
+import numpy as np
+import numpy.typing as npt
+
+logger = logging.getLogger(__name__)
+
+# If the wanted frame is at most this many frames ahead, decoding forward is cheaper than seeking.
+MAX_FORWARD_DECODE = 32
+
+DEFAULT_CACHE_BYTES = 256 * 1024 * 1024
+DEFAULT_MAX_OPEN_VIDEOS = 8
+DEFAULT_JPEG_QUALITY = 90
+
+T = TypeVar("T")
+
+
+class VideoDecoder:
+    """
+    Decodes frames from a single video file.
+
+    Sequential (monotonic) access decodes forward without seeking, random access seeks.
+    """
+
+    def __init__(self, video_path: Path) -> None:
+        import cv2  # deferred, so that importing this module stays cheap for datasets without videos
+
+        self.video_path = video_path
+        self._capture = cv2.VideoCapture(str(video_path))
+        if not self._capture.isOpened():
+            raise OSError(f"Failed to open video {video_path}")
+        self.frame_rate = self._capture.get(cv2.CAP_PROP_FPS)
+        self.frame_count = int(self._capture.get(cv2.CAP_PROP_FRAME_COUNT))
+        self._position = 0  # index of the next frame `read()` will return
+        self.lock = threading.Lock()  # held while decoding, a capture can't be shared between threads
+
+    def frame_index(self, timestamp: float) -> int:
+        """The index of the frame shown at `timestamp` (in seconds)."""
+        # Round rather than truncate, so that e.g. `0.3 * 10 == 2.9999999999999996` maps to frame 3.
+        index = round(timestamp * self.frame_rate)
+        if self.frame_count > 0:
+            index = min(index, self.frame_count - 1)
+        return max(index, 0)
+
+    def read(self, index: int) -> npt.NDArray[Any]:
+        """Decode the frame at `index`."""
+        import cv2
+
+        if index < self._position or index - self._position > MAX_FORWARD_DECODE:
+            self._capture.set(cv2.CAP_PROP_POS_FRAMES, index)
+            self._position = index
+
+        while self._position < index:
+            if not self._capture.grab():
+                break
+            self._position += 1
+
+        success, frame = self._capture.read()
+        if not success:
+            raise ValueError(f"Failed to decode frame {index} of {self.video_path}")
+        self._position = index + 1
+        return frame
+
+    def close(self) -> None:
+        self._capture.release()
+
+
+class VideoFrameCache:
+    """
+    Caches decoded frames and open decoders, evicting the least recently used ones.
+
+    The cache is thread-safe: different videos are decoded concurrently, the same video one frame at a time.
+
+    `max_bytes`: upper bound on the total size of the cached frames.
+    `max_open_videos`: upper bound on the number of video files kept open at once.
+    """
+
+    def __init__(self, max_bytes: int = DEFAULT_CACHE_BYTES, max_open_videos: int = DEFAULT_MAX_OPEN_VIDEOS) -> None:
+        self.max_bytes = max_bytes
+        self.max_open_videos = max_open_videos
+        self.num_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.decode_seconds = 0.0  # summed over all decoding threads
+        self.max_decode_seconds = 0.0
+        self._frames: OrderedDict[tuple[Path, int], npt.NDArray[Any]] = OrderedDict()
+        self._decoders: OrderedDict[Path, VideoDecoder] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _decoder(self, video_path: Path) -> VideoDecoder:
+        decoder = self._decoders.get(video_path)
+        if decoder is None:
+            decoder = VideoDecoder(video_path)
+            self._decoders[video_path] = decoder
+            while len(self._decoders) > self.max_open_videos:
+                # Not closed explicitly: another thread may still be decoding from it.
+                # The capture is released once the last reference is dropped.
+                self._decoders.popitem(last=False)
+        else:
+            self._decoders.move_to_end(video_path)
+        return decoder
+
+    def get_frame(self, video_path: Path, timestamp: float) -> npt.NDArray[Any]:
+        with self._lock:
+            decoder = self._decoder(video_path)
+            key = (video_path, decoder.frame_index(timestamp))
+
+            frame = self._frames.get(key)
+            if frame is not None:
+                self.hits += 1
+                self._frames.move_to_end(key)
+                return frame
+            self.misses += 1
+
+        with decoder.lock:
+            start_time = time.perf_counter()
+            frame = decoder.read(key[1])
+            decode_seconds = time.perf_counter() - start_time
+
+        with self._lock:
+            self.decode_seconds += decode_seconds
+            self.max_decode_seconds = max(self.max_decode_seconds, decode_seconds)
+            if frame.nbytes <= self.max_bytes and key not in self._frames:
+                self._frames[key] = frame
+                self.num_bytes += frame.nbytes
+                while self.num_bytes > self.max_bytes:
+                    _, evicted = self._frames.popitem(last=False)
+                    self.num_bytes -= evicted.nbytes
+        return frame
+
+    def close(self) -> None:
+        """Release all open decoders and cached frames."""
+        with self._lock:
+            decoders, self._decoders = self._decoders, OrderedDict()
+            self._frames.clear()
+            self.num_bytes = 0
+        # Closed without holding `_lock`, as decoding threads take a decoder's lock before `_lock`:
+        for decoder in decoders.values():
+            with decoder.lock:
+                decoder.close()
+
+
+def is_video_frame(value: Any) -> bool:
+    """Whether `value` is a LeRobot reference to a video frame: a `{"path": …, "timestamp": …}` dict."""
+    return isinstance(value, dict) and "path" in value and "timestamp" in value
+
+
+class FramePrefetcher:
+    """
+    Decodes the video frames referenced by upcoming rows on background threads.
+
+    Each video column gets its own decoding thread, so all camera streams are decoded in parallel
+    while each stream is still read front to back. At most `lookahead` rows are decoded ahead of
+    the consumer, and rows are returned in their original order.
+
+    `transform`: applied to every decoded frame on its decoding thread, e.g. to downscale it.
+    """
+
+    def __init__(
+        self,
+        video_cache: VideoFrameCache,
+        videos_dir: Path,
+        lookahead: int = 16,
+        transform: Callable[[npt.NDArray[Any]], npt.NDArray[Any]] | None = None,
+    ) -> None:
+        self.video_cache = video_cache
+        self.videos_dir = videos_dir
+        self.lookahead = lookahead
+        self.transform = transform
+        self._executors: dict[str, ThreadPoolExecutor] = {}
+
+    def _submit(self, column_name: str, value: dict[str, Any]) -> Future[npt.NDArray[Any]]:
+        executor = self._executors.get(column_name)
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=f"decode-{column_name}")
+            self._executors[column_name] = executor
+        path = self.videos_dir / Path(value["path"])
+        return executor.submit(self._decode, path, value["timestamp"])
+
+    def _decode(self, path: Path, timestamp: float) -> npt.NDArray[Any]:
+        frame = self.video_cache.get_frame(path, timestamp)
+        return frame if self.transform is None else self.transform(frame)
+
+    def iter_rows(
+        self, items: Iterable[T], get_row: Callable[[T], dict[str, Any]] | None = None
+    ) -> Iterator[tuple[T, dict[str, npt.NDArray[Any]]]]:
+        """
+        Yields every item together with the decoded frames of its row, keyed by column name.
+
+        `get_row`: returns the row of an item, by default the items are the rows.
+        """
+        pending: deque[tuple[T, dict[str, Future[npt.NDArray[Any]]]]] = deque()
+        try:
+            for item in items:
+                row = get_row(item) if get_row is not None else item
+                futures = {
+                    column_name: self._submit(column_name, value)
+                    for column_name, value in row.items()  # type: ignore[attr-defined]
+                    if is_video_frame(value)
+                }
+                pending.append((item, futures))
+                if len(pending) > self.lookahead:
+                    yield self._resolve(*pending.popleft())
+            while pending:
+                yield self._resolve(*pending.popleft())
+        finally:
+            for _, futures in pending:
+                for future in futures.values():
+                    future.cancel()
+
+    @staticmethod
+    def _resolve(item: T, futures: dict[str, Future[npt.NDArray[Any]]]) -> tuple[T, dict[str, npt.NDArray[Any]]]:
+        return item, {column_name: future.result() for column_name, future in futures.items()}
+
+    def close(self) -> None:
+        for executor in self._executors.values():
+            _shutdown(executor, wait=True)
+        self._executors.clear()
+
+    def __enter__(self) -> FramePrefetcher:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()
+
+
+def encode_jpeg(frame: npt.NDArray[Any], quality: int = DEFAULT_JPEG_QUALITY) -> bytes:
+    """Compress a decoded (BGR) frame to JPEG."""
+    import cv2
+
+    success, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])
+    if not success:
+        raise ValueError(f"Failed to encode a frame of shape {frame.shape} to JPEG")
+    return encoded.tobytes()
+
+
+# Worker processes shared by all `FrameEncoder`s, see `encoder_pool`:
+_encoder_pool: ProcessPoolExecutor | None = None
+_encoder_pool_lock = threading.Lock()
+
+
+def encoder_pool(max_workers: int | None = None) -> ProcessPoolExecutor:
+    """
+    The pool of processes that encode frames, started on first use and shared by all conversions.
+
+    Workers are spawned rather than forked: forking a process with running threads (decoders, the Rerun
+    batcher, a web server) can deadlock. `max_workers` only applies to the first call, it defaults to the
+    number of CPUs.
+    """
+    global _encoder_pool
+    with _encoder_pool_lock:
+        if _encoder_pool is None:
+            _encoder_pool = ProcessPoolExecutor(max_workers, mp_context=multiprocessing.get_context("spawn"))
+            # Shut down before `multiprocessing` waits for child processes to exit, which it does before the
+            # usual exit hooks (that would shut the pool down) when this is itself a worker process. Ahead
+            # of the finalizers of the pool's queues (priority 10), which must still be open to stop the workers:
+            multiprocessing.util.Finalize(
+                _encoder_pool, _shutdown, args=(_encoder_pool,), kwargs={"wait": True}, exitpriority=20
+            )
+        return _encoder_pool
+
+
+def warm_up_encoder_pool() -> None:
+    """Starts the workers of `encoder_pool`, so that the first conversion that encodes frames doesn't wait for them."""
+    pool = encoder_pool()
+    blank = np.zeros((8, 8, 3), dtype=np.uint8)
+    for future in [pool.submit(encode_jpeg, blank) for _ in range(os.cpu_count() or 1)]:
+        future.result()
+
+
+def _discard_encoder_pool(pool: Executor) -> None:
+    """Forgets a pool that broke (e.g. a worker was killed), so that the next conversion starts a new one."""
+    global _encoder_pool
+    with _encoder_pool_lock:
+        if _encoder_pool is pool:
+            _encoder_pool = None
+    _shutdown(pool, wait=False)
+
+
+def _shutdown(executor: Executor, wait: bool) -> None:
+    """Shuts `executor` down, cancelling the work that hasn't started yet (Python 3.8 finishes it first)."""
+    if sys.version_info >= (3, 9):
+        executor.shutdown(wait=wait, cancel_futures=True)
+    else:
+        executor.shutdown(wait=wait)
+
+
+class FrameEncoder:
+    """
+    Compresses decoded video frames to JPEG in a pool of worker processes.
+
+    Frames are encoded in parallel with the consumer, at most `lookahead` rows ahead of it, and rows
+    are returned in their original order.
+
+    `quality`: JPEG quality, from 0 to 100.
+    `executor`: where frames are encoded, the shared `encoder_pool` by default.
+    """
+
+    def __init__(
+        self, quality: int = DEFAULT_JPEG_QUALITY, lookahead: int = 16, executor: Executor | None = None
+    ) -> None:
+        self.quality = quality
+        self.lookahead = lookahead
+        self._executor = executor if executor is not None else encoder_pool()
+        self._pending: deque[tuple[Any, dict[str, Future[bytes]]]] = deque()
+
+    def iter_rows(self, rows: Iterable[tuple[T, dict[str, npt.NDArray[Any]]]]) -> Iterator[tuple[T, dict[str, bytes]]]:
+        """Takes items with their decoded frames (see `FramePrefetcher.iter_rows`), yields them with encoded frames."""
+        pending = self._pending
+        try:
+            for item, frames in rows:
+                futures = {
+                    column_name: self._executor.submit(encode_jpeg, frame, self.quality)
+                    for column_name, frame in frames.items()
+                }
+                pending.append((item, futures))
+                if len(pending) > self.lookahead:
+                    yield self._resolve(*pending.popleft())
+            while pending:
+                yield self._resolve(*pending.popleft())
+        except BrokenProcessPool:
+            _discard_encoder_pool(self._executor)
+            raise
+        finally:
+            self.close()
+
+    @staticmethod
+    def _resolve(item: T, futures: dict[str, Future[bytes]]) -> tuple[T, dict[str, bytes]]:
+        return item, {column_name: future.result() for column_name, future in futures.items()}
+
+    def close(self) -> None:
+        """Cancels the frames that are still waiting to be encoded. The pool itself is left running."""
+        while self._pending:
+            _, futures = self._pending.popleft()
+            for future in futures.values():
+                future.cancel()
+
+    def __enter__(self) -> FrameEncoder:
+        return self
+
+    def __exit__(self, *args: Any) -> None:
+        self.close()